@@ -0,0 +1,209 @@
+"""
+Buffered activity logging.
+
+log_activity() only appends to an in-memory buffer; a background thread
+writes the buffer to activity_logs with one executemany per batch, when it
+reaches FLUSH_SIZE entries or every FLUSH_INTERVAL seconds, and once more
+at interpreter exit. Entries remember the campus they were logged for and
+are written to that campus's database. The same thread periodically rolls
+entries older than the retention window into per-year archive tables, on
+every campus:
+
+    python activity_log.py    # run a rollover now (on CAMPUS)
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from database import current_campus, get_connection, list_campuses
+
+FLUSH_SIZE = 100
+FLUSH_INTERVAL = 2.0
+
+# Entries kept while the database is unwritable; the oldest are dropped
+# beyond this
+MAX_BUFFERED = 10000
+
+RETENTION_DAYS = int(os.environ.get("ACTIVITY_LOG_RETENTION_DAYS", 90))
+ROLLOVER_INTERVAL = 3600
+
+# Entries of one year older than the cutoff: (cutoff, "YYYY")
+ROLLOVER_WHERE = "WHERE timestamp < ? AND substr(timestamp, 1, 4) = ?"
+ROLLOVER_DELETE_SQL = f"DELETE FROM activity_logs {ROLLOVER_WHERE}"
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp(dt):
+    # Same format as SQLite's CURRENT_TIMESTAMP (UTC)
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ================= ROLLOVER =================
+def rollover(conn, retention_days=RETENTION_DAYS):
+    """
+    Moves activity_logs rows older than the retention window into
+    activity_logs_<year> archive tables. Old years can then be dropped
+    with a single DROP TABLE. Returns the number of rows moved.
+    """
+    cutoff = _timestamp(datetime.now(timezone.utc) - timedelta(days=retention_days))
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT DISTINCT substr(timestamp, 1, 4) AS year
+        FROM activity_logs WHERE timestamp < ?
+    """, (cutoff,))
+    years = [r[0] for r in cursor.fetchall() if r[0] and r[0].isdigit()]
+
+    moved = 0
+    try:
+        for year in years:
+            archive = f"activity_logs_{year}"
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {archive} (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER,
+                    action TEXT NOT NULL,
+                    timestamp TIMESTAMP
+                )
+            """)
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO {archive} (id, user_id, action, timestamp)
+                SELECT id, user_id, action, timestamp FROM activity_logs
+                {ROLLOVER_WHERE}
+            """, (cutoff, year))
+            cursor.execute(ROLLOVER_DELETE_SQL, (cutoff, year))
+            moved += cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return moved
+
+
+# ================= WRITER =================
+class ActivityLogWriter:
+    def __init__(self, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._last_rollover = 0.0
+
+    def log(self, user_id, action):
+        entry = (current_campus(), user_id, action, _timestamp(datetime.now(timezone.utc)))
+
+        with self._lock:
+            if self._stopped:
+                # After shutdown: write through rather than drop the event
+                for error, _ in self._write([entry]):
+                    logger.error("Activity log write failed: %s", error)
+                return
+
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.flush_size
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="activity-log-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+
+        failed = self._write(batch)
+        if failed:
+            self._requeue(failed)
+            raise failed[0][0]
+
+    def _requeue(self, failed):
+        """Puts unwritten entries back in front of the newer ones."""
+        entries = [entry for _, entries in failed for entry in entries]
+        with self._lock:
+            self._buffer = entries + self._buffer
+            dropped = len(self._buffer) - MAX_BUFFERED
+            if dropped > 0:
+                del self._buffer[:dropped]
+        if dropped > 0:
+            logger.error("Activity log buffer full; dropped %d oldest entries", dropped)
+
+    def close(self):
+        with self._lock:
+            self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def _write(self, batch):
+        """
+        Writes each campus's entries in one transaction. Returns
+        [(error, entries)] for the campuses that could not be written.
+        """
+        by_campus = {}
+        for entry in batch:
+            by_campus.setdefault(entry[0], []).append(entry)
+
+        failed = []
+        for campus, entries in by_campus.items():
+            try:
+                conn = get_connection(campus)
+                try:
+                    conn.executemany(
+                        "INSERT INTO activity_logs (user_id, action, timestamp) VALUES (?, ?, ?)",
+                        [entry[1:] for entry in entries]
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception as e:
+                failed.append((e, entries))
+        return failed
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+            try:
+                self.flush()
+                if time.monotonic() - self._last_rollover > ROLLOVER_INTERVAL:
+                    self._last_rollover = time.monotonic()
+                    for campus in list_campuses():
+                        conn = get_connection(campus)
+                        try:
+                            rollover(conn)
+                        finally:
+                            conn.close()
+            except Exception:
+                # Keep the writer alive; flush() put unwritten entries back
+                logger.exception("Activity log flush failed")
+
+
+writer = ActivityLogWriter()
+
+
+def log_activity(user_id, action):
+    writer.log(user_id, action)
+
+
+if __name__ == "__main__":
+    conn = get_connection()
+    moved = rollover(conn)
+    conn.close()
+    print(f"✅ Archived {moved} activity log entries older than {RETENTION_DAYS} days")
@@ -0,0 +1,64 @@
+"""
+Per-(table, month, year) running sums of the raw readings.
+
+monthly_aggregates is kept current by the triggers created in init_db.py,
+so averages never need to scan the data tables. Run this module to rebuild
+it from scratch for an existing database:
+
+    python aggregates.py
+"""
+from database import get_connection
+from timeseries import contribution_sql
+
+DATA_TABLES = ("energy_data", "water_data", "waste_data", "greenery_data")
+
+OVERALL_AVERAGE_SQL = """
+    SELECT SUM(value_sum) / SUM(value_count) AS avg
+    FROM monthly_aggregates
+    WHERE table_name=?
+"""
+
+
+def overall_average(cursor, table):
+    cursor.execute(OVERALL_AVERAGE_SQL, (table,))
+    return cursor.fetchone()["avg"]
+
+
+def rebuild_monthly_aggregates(conn):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM monthly_aggregates")
+
+    for table in DATA_TABLES:
+        cursor.execute(f"""
+            INSERT INTO monthly_aggregates (table_name, year, month, value_sum, value_count)
+            SELECT ?, year, month, SUM(value), COUNT(*)
+            FROM {table}
+            GROUP BY year, month
+        """, (table,))
+
+    # Metered months (timeseries.py) count as one reading each
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='meter_monthly'"
+    )
+    if cursor.fetchone():
+        cursor.execute(f"""
+            INSERT INTO monthly_aggregates (table_name, year, month, value_sum, value_count)
+            SELECT m.table_name, m.year, m.month,
+                   SUM({contribution_sql("m")}), SUM(m.value_count > 0)
+            FROM meter_monthly m
+            WHERE 1
+            GROUP BY m.table_name, m.year, m.month
+            ON CONFLICT(table_name, year, month) DO UPDATE SET
+                value_sum = value_sum + excluded.value_sum,
+                value_count = value_count + excluded.value_count
+        """)
+
+    conn.commit()
+
+
+if __name__ == "__main__":
+    conn = get_connection()
+    rebuild_monthly_aggregates(conn)
+    months = conn.execute("SELECT COUNT(*) FROM monthly_aggregates").fetchone()[0]
+    conn.close()
+    print(f"✅ Rebuilt monthly aggregates ({months} table-months)")
@@ -0,0 +1,280 @@
+from flask import Blueprint, Response, g, request, session, stream_with_context, jsonify
+from database import get_db, list_campuses
+from cache import bump_generation, current_generation
+from forecast import cached_models, linear_forecast
+from campuses import compare_campuses
+from dataentry import (
+    ALLOWED_TABLES, decode_cursor, encode_cursor,
+    entries_query, parse_page_size
+)
+from api_tokens import verify_token
+from recalc import mark_dirty
+import activity_log
+import json
+import sqlite3
+
+api_bp = Blueprint("api", __name__, url_prefix="/api")
+
+API_MAX_PAGE_SIZE = 5000
+
+# Readings validated and written per executemany batch on /api/ingest
+INGEST_BATCH = 5000
+
+
+# ---------------- ENTRIES ----------------
+@api_bp.route("/entries")
+def entries():
+    """
+    JSON page of readings with keyset pagination. Rows are streamed
+    straight from the cursor; pass `next_cursor` back as `after` to get
+    the following page.
+    """
+    if "user_id" not in session:
+        return jsonify(error="Login required"), 401
+
+    table = request.args.get("type", "energy_data")
+    if table not in ALLOWED_TABLES:
+        return jsonify(error="Invalid table"), 400
+
+    after = None
+    if request.args.get("after"):
+        after = decode_cursor(request.args["after"])
+        if after is None:
+            return jsonify(error="Invalid cursor"), 400
+
+    per_page = parse_page_size(
+        request.args.get("per_page"), maximum=API_MAX_PAGE_SIZE
+    )
+
+    query, params = entries_query(
+        table,
+        request.args.get("month"),
+        request.args.get("year"),
+        after,
+        per_page + 1
+    )
+
+    def generate():
+        # Runs after the view returns, so take the connection here
+        cursor = get_db().cursor()
+        cursor.execute(query, params)
+
+        yield '{"type": %s, "entries": [' % json.dumps(table)
+
+        last = None
+        has_more = False
+        for count, row in enumerate(cursor):
+            if count == per_page:
+                has_more = True
+                break
+            if last is not None:
+                yield ","
+            last = row
+            yield json.dumps({
+                "id": row["id"],
+                "value": row["value"],
+                "month": row["month"],
+                "year": row["year"],
+                "entered_by": row["username"]
+            })
+
+        # Only report a cursor when the extra row was actually there
+        next_cursor = encode_cursor(last) if has_more else None
+        yield '], "next_cursor": %s}' % json.dumps(next_cursor)
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+# ---------------- FORECAST ----------------
+@api_bp.route("/forecast")
+def forecast():
+    """
+    Next-month forecast. The linear prediction is always available; the
+    fitted models are null (202) until the background fit has finished.
+    """
+    if "user_id" not in session:
+        return jsonify(error="Login required"), 401
+
+    models = cached_models(current_generation())
+    return jsonify(
+        linear=linear_forecast(get_db().cursor()),
+        models=models or None
+    ), 200 if models is not None else 202
+
+
+@api_bp.route("/campuses")
+def campuses():
+    """Per-campus rollups for comparison (admins only)."""
+    if "user_id" not in session:
+        return jsonify(error="Login required"), 401
+
+    if session["role"] != "admin":
+        return jsonify(error="Admin only"), 403
+
+    return jsonify(campuses=compare_campuses())
+
+
+# ---------------- CHART SERIES ----------------
+@api_bp.route("/chart_series")
+def chart_series_view():
+    """
+    Points for one dashboard chart: ?series=score|energy|water|waste|greenery
+    &resolution=auto|monthly|quarterly|yearly&start=YYYY-MM&end=YYYY-MM
+    &points=N (&building=name for metered component series).
+    """
+    if "user_id" not in session:
+        return jsonify(error="Login required"), 401
+
+    # numpy is only loaded once a chart is requested
+    from charts import (
+        DEFAULT_POINTS, MAX_POINTS, MIN_POINTS, RESOLUTIONS, SERIES, chart_series,
+        parse_month
+    )
+
+    series = request.args.get("series", "score")
+    resolution = request.args.get("resolution", "auto")
+    if series not in SERIES:
+        return jsonify(error="Invalid series"), 400
+    if resolution != "auto" and resolution not in RESOLUTIONS:
+        return jsonify(error="Invalid resolution"), 400
+
+    bounds = []
+    for name in ("start", "end"):
+        raw = request.args.get(name)
+        bound = parse_month(raw) if raw else None
+        if raw and bound is None:
+            return jsonify(error=f"Invalid {name}, expected YYYY-MM"), 400
+        bounds.append(bound)
+
+    points = parse_page_size(request.args.get("points"), DEFAULT_POINTS, MAX_POINTS)
+    if points < MIN_POINTS:
+        return jsonify(error=f"Invalid points, expected at least {MIN_POINTS}"), 400
+
+    return jsonify(chart_series(
+        get_db().cursor(), series, resolution, *bounds,
+        points=points, building=request.args.get("building") or None
+    ))
+
+
+# ---------------- INGEST ----------------
+def _bearer_token():
+    header = request.headers.get("Authorization", "")
+    scheme, _, token = header.partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else None
+
+
+def _replay(cursor, token_id, key):
+    cursor.execute("""
+        SELECT response FROM ingest_requests
+        WHERE token_id=? AND idempotency_key=?
+    """, (token_id, key))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    response = jsonify(json.loads(row["response"]))
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+@api_bp.route("/ingest", methods=["POST"])
+def ingest():
+    """
+    Batched readings from meter gateways, authenticated with an API token
+    (Authorization: Bearer ...). Accepts a JSON list (or
+    {"readings": [...]}), NDJSON or CSV with metric, value, month and year
+    fields; ?metric= sets the metric for readings without one. Readings
+    with meter and timestamp fields instead are stored as time series
+    (timeseries.py). Everything is written in one transaction; affected
+    months are queued for rescoring. Repeating a request with the same
+    Idempotency-Key returns the original response without writing again.
+    The X-Campus header (or ?campus=) picks the campus; tokens are only
+    valid on their own campus.
+    """
+    # pandas is only loaded by workers that receive ingest traffic
+    from ingest import (
+        IngestError, csv_batches, json_batches, ndjson_batches,
+        prepare_readings, write_readings
+    )
+    from timeseries import prepare_meter_readings, write_meter_readings
+
+    campus = request.headers.get("X-Campus") or request.args.get("campus")
+    if campus:
+        if campus not in list_campuses():
+            return jsonify(error="Unknown campus"), 400
+        g.campus = campus
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    token = verify_token(cursor, _bearer_token())
+    if token is None:
+        return jsonify(error="Invalid or missing API token"), 401
+
+    key = request.headers.get("Idempotency-Key")
+    if key:
+        replay = _replay(cursor, token["id"], key)
+        if replay is not None:
+            return replay
+
+    default_metric = request.args.get("metric")
+
+    if request.mimetype == "application/x-ndjson":
+        batches = ndjson_batches(request.stream, INGEST_BATCH)
+    elif request.mimetype == "text/csv":
+        batches = csv_batches(request.stream, INGEST_BATCH)
+    else:
+        body = request.get_json(silent=True)
+        if body is None:
+            return jsonify(error="Body must be JSON, NDJSON or CSV"), 400
+        if isinstance(body, dict):
+            default_metric = body.get("metric", default_metric)
+        batches = json_batches(body, INGEST_BATCH)
+
+    rows = 0
+    months = set()
+    try:
+        for row_offset, df in batches:
+            if "timestamp" in df.columns:
+                # Metered readings go to the time-series partitions
+                readings = prepare_meter_readings(cursor, df, row_offset)
+                months |= write_meter_readings(
+                    cursor, readings["meter_id"], readings["ts"], readings["value"]
+                )
+            else:
+                readings = prepare_readings(df, row_offset, default_metric)
+                months |= write_readings(cursor, readings, token["user_id"])
+            rows += len(readings["value"])
+
+        if rows == 0:
+            raise IngestError("No readings in request body")
+
+        result = {"rows": rows, "months": len(months)}
+
+        if key:
+            cursor.execute(
+                "DELETE FROM ingest_requests WHERE created_at < datetime('now', '-1 day')"
+            )
+            cursor.execute("""
+                INSERT INTO ingest_requests (token_id, idempotency_key, response)
+                VALUES (?, ?, ?)
+            """, (token["id"], key, json.dumps(result)))
+
+        conn.commit()
+    except (IngestError, UnicodeDecodeError) as e:
+        conn.rollback()
+        return jsonify(error=str(e)), 400
+    except sqlite3.IntegrityError:
+        # A concurrent retry with the same key committed first
+        conn.rollback()
+        replay = _replay(cursor, token["id"], key) if key else None
+        if replay is None:
+            raise
+        return replay
+
+    for month, year in months:
+        mark_dirty(month, year)
+    bump_generation()
+    activity_log.log_activity(token["user_id"], f"API ingest ({token['name']}): {rows} readings")
+
+    return jsonify(result), 201
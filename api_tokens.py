@@ -0,0 +1,88 @@
+"""
+API tokens for meter gateways posting to /api/ingest.
+
+Tokens are random and only their SHA-256 is stored, so a database leak does
+not expose them. Readings posted with a token are recorded as entered by
+the token's user:
+
+    python api_tokens.py create gateway-north --user admin
+    python api_tokens.py revoke gateway-north
+    python api_tokens.py --campus north create gateway-north
+
+A token belongs to one campus; gateways send it with X-Campus: <campus>.
+"""
+import argparse
+import hashlib
+import secrets
+import sys
+
+from database import get_connection
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_token(conn, name, user_id):
+    """Stores a new token and returns it. It cannot be recovered later."""
+    token = secrets.token_urlsafe(32)
+    conn.execute(
+        "INSERT INTO api_tokens (name, token_hash, user_id) VALUES (?, ?, ?)",
+        (name, hash_token(token), user_id)
+    )
+    conn.commit()
+    return token
+
+
+def verify_token(cursor, token):
+    """Returns the (id, name, user_id) row of an active token, or None."""
+    if not token:
+        return None
+    cursor.execute("""
+        SELECT id, name, user_id FROM api_tokens
+        WHERE token_hash=? AND revoked=0
+    """, (hash_token(token),))
+    return cursor.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage /api/ingest tokens")
+    parser.add_argument("--campus", help="campus database (default: CAMPUS)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    create = sub.add_parser("create")
+    create.add_argument("name")
+    create.add_argument("--user", default="admin", help="username readings are recorded under")
+
+    revoke = sub.add_parser("revoke")
+    revoke.add_argument("name")
+
+    args = parser.parse_args()
+    conn = get_connection(args.campus)
+
+    try:
+        if args.command == "create":
+            user = conn.execute(
+                "SELECT id FROM users WHERE username=?", (args.user,)
+            ).fetchone()
+            if user is None:
+                print(f"❌ Unknown user: {args.user}")
+                return 1
+
+            token = create_token(conn, args.name, user["id"])
+            print(f"✅ Token for {args.name} (store it now, it is not shown again):")
+            print(token)
+        else:
+            cursor = conn.execute(
+                "UPDATE api_tokens SET revoked=1 WHERE name=? AND revoked=0", (args.name,)
+            )
+            conn.commit()
+            print(f"✅ Revoked {cursor.rowcount} token(s) named {args.name}")
+    finally:
+        conn.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,33 @@
+"""
+Flask application.
+
+create_app() builds the app; the module-level `app` is what gunicorn loads
+(gunicorn app:app). pandas, numpy, openpyxl and reportlab are only imported
+by the code paths that use them (uploads, ingest, charts, forecast fitting,
+PDF rendering), so a worker that has not served those requests yet stays
+small and starts quickly. python -m benchmarks.startup measures this.
+"""
 from manageuser import manageuser_bp
 from dataentry import dataentry_bp
+from api import api_bp
+from campuses import campuses_bp
 from flask import (
     Flask, render_template, request,
-    redirect, url_for, session, send_file
+    redirect, url_for, session, send_file, make_response
 )
-import numpy as np
-from database import get_connection
-import hashlib
-import pandas as pd
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import json
+from database import DEFAULT_CAMPUS, current_campus, get_db, init_app, list_campuses
+from aggregates import overall_average
+from forecast import TREND_AVERAGE_SQL, linear_forecast, cached_models
+from cache import current_generation, bump_generation, get_cached, set_cached
+from jobs import jobs_bp, enqueue
+from auth import authenticate, hash_password
+import activity_log
+import instrumentation
+import recalc
+from reports import cached_report
+import io
 import os
 
-app = Flask(__name__, template_folder="templates")
-app.secret_key = os.environ.get("SECRET_KEY", "dev_secret")
-app.register_blueprint(manageuser_bp)
-app.register_blueprint(dataentry_bp)
-
-
 ALLOWED_TABLES = {
     "energy_data",
     "water_data",
@@ -28,56 +37,43 @@ ALLOWED_TABLES = {
 
 # -------------------- HELPERS --------------------
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
 def log_activity(action):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO activity_logs (user_id, action) VALUES (?, ?)",
-        (session["user_id"], action)
-    )
-    conn.commit()
-    conn.close()
+    # Buffered; written in batches by the activity log thread
+    activity_log.log_activity(session["user_id"], action)
 
 
 def insert_data(table, value, month, year):
     if table not in ALLOWED_TABLES:
         raise ValueError("Invalid table")
 
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
+    conn = get_db()
+    conn.execute(
         f"INSERT INTO {table} (value, month, year, entered_by) VALUES (?, ?, ?, ?)",
         (value, month, year, session["user_id"])
     )
+
     conn.commit()
-    conn.close()
 
     log_activity(f"Inserted into {table}")
+    bump_generation()
 
 
 # -------------------- AUTH --------------------
 
-@app.route("/", methods=["GET", "POST"])
 def login():
     if "user_id" in session:
         return redirect(url_for("dashboard"))
 
+    campuses = list_campuses()
+
     if request.method == "POST":
-        username = request.form["username"]
-        password = hash_password(request.form["password"])
+        campus = request.form.get("campus") or DEFAULT_CAMPUS
+        if campus not in campuses:
+            return "Invalid login ❌"
 
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM users WHERE username=? AND password_hash=?",
-            (username, password)
-        )
-        user = cursor.fetchone()
-        conn.close()
+        # Users belong to a campus; get_db() now opens that campus's file
+        session["campus"] = campus
+        user = authenticate(get_db(), request.form["username"], request.form["password"])
 
         if user:
             session["user_id"] = user["id"]
@@ -86,12 +82,12 @@ def login():
             log_activity("Logged in")
             return redirect(url_for("dashboard"))
 
+        session.pop("campus", None)
         return "Invalid login ❌"
 
-    return render_template("login.html")
+    return render_template("login.html", campuses=campuses)
 
 
-@app.route("/logout")
 def logout():
     session.clear()
     return redirect(url_for("login"))
@@ -99,27 +95,13 @@ def logout():
 
 # -------------------- DASHBOARD --------------------
 
-@app.route("/dashboard")
-def dashboard():
-    if "user_id" not in session:
-        return redirect(url_for("login"))
-
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT month || '-' || year AS label, total_score
-        FROM sustainability_scores
-        ORDER BY year, month
-    """)
-    rows = cursor.fetchall()
-
-    labels = [r["label"] for r in rows]
-    scores = [r["total_score"] for r in rows]
+def build_dashboard_payload(cursor):
+    # The score chart itself is loaded separately from /api/chart_series
+    cursor.execute(TREND_AVERAGE_SQL)
+    stats = cursor.fetchone()
 
     def get_avg(table):
-        cursor.execute(f"SELECT AVG(value) as avg FROM {table}")
-        r = cursor.fetchone()["avg"]
+        r = overall_average(cursor, table)
         return round(r, 2) if r else 0
 
     avg_energy = get_avg("energy_data")
@@ -127,7 +109,7 @@ def dashboard():
     avg_waste = get_avg("waste_data")
     avg_greenery = get_avg("greenery_data")
 
-    overall_score = round(sum(scores) / len(scores), 2) if scores else 0
+    overall_score = round(stats["sum_y"] / stats["n"], 2) if stats and stats["n"] else 0
 
     grade = "D"
     if overall_score >= 85:
@@ -140,167 +122,136 @@ def dashboard():
     predicted_score = None
     trend = "Stable"
 
-    labels_with_prediction = labels.copy()
-    scores_with_prediction = scores.copy()
+    forecast = linear_forecast(cursor)
+    if forecast:
+        predicted_score = forecast["predicted_score"]
 
-    if len(scores) >= 2:
-        x = np.arange(len(scores))
-        y = np.array(scores)
-        m, b = np.polyfit(x, y, 1)
-        predicted_score = round(m * len(scores) + b, 2)
-
-        if predicted_score > scores[-1]:
+        if predicted_score > forecast["last_score"]:
             trend = "Improving 📈"
-        elif predicted_score < scores[-1]:
+        elif predicted_score < forecast["last_score"]:
             trend = "Declining 📉"
 
-        labels_with_prediction.append("Next")
-        scores_with_prediction.append(predicted_score)
+    return {
+        "avg_energy": avg_energy,
+        "avg_water": avg_water,
+        "avg_waste": avg_waste,
+        "avg_greenery": avg_greenery,
+        "overall_score": overall_score,
+        "grade": grade,
+        "predicted_score": predicted_score,
+        "trend": trend
+    }
 
-    conn.close()
 
-    return render_template(
+def dashboard():
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    # The page only changes when data is written (generation bump) or for
+    # a different user or campus, so the ETag covers all three.
+    generation = current_generation()
+    # Fitted in the background; the page is re-sent once they are ready
+    models = cached_models(generation)
+    etag = (
+        f"dashboard-{current_campus()}-{generation}-{session['user_id']}-{session['role']}"
+        f"-{'models' if models is not None else 'linear'}"
+    )
+
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    payload = get_cached("dashboard", generation)
+    if payload is None:
+        payload = build_dashboard_payload(get_db().cursor())
+        set_cached("dashboard", generation, payload)
+
+    response = make_response(render_template(
         "dashboard.html",
         role=session["role"],
-        labels=json.dumps(labels_with_prediction),
-        scores=json.dumps(scores_with_prediction),
-        avg_energy=avg_energy,
-        avg_water=avg_water,
-        avg_waste=avg_waste,
-        avg_greenery=avg_greenery,
-        overall_score=overall_score,
-        grade=grade,
-        predicted_score=predicted_score,
-        trend=trend
-    )
+        models=models,
+        **payload
+    ))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 # -------------------- EXCEL UPLOAD --------------------
-@app.route("/upload_sustainability_excel", methods=["GET", "POST"])
 def upload_sustainability_excel():
     if "user_id" not in session:
         return redirect(url_for("login"))
 
-    avg_uploaded = None
+    error = None
 
     if request.method == "POST":
         file = request.files["file"]
 
-        if file and file.filename.endswith(".xlsx"):
-            df = pd.read_excel(file)
-
-            conn = get_connection()
-            cursor = conn.cursor()
-
-            total_scores = []
-
-            for _, row in df.iterrows():
-                month = int(row["month"])
-                year = int(row["year"])
-                energy = float(row["energy"])
-                water = float(row["water"])
-                waste = float(row["waste"])
-                greenery = float(row["greenery"])
-
-                # INSERT RAW DATA (NO extra connection)
-                cursor.execute(
-                    "INSERT INTO energy_data (value, month, year, entered_by) VALUES (?, ?, ?, ?)",
-                    (energy, month, year, session["user_id"])
-                )
-
-                cursor.execute(
-                    "INSERT INTO water_data (value, month, year, entered_by) VALUES (?, ?, ?, ?)",
-                    (water, month, year, session["user_id"])
-                )
-
-                cursor.execute(
-                    "INSERT INTO waste_data (value, month, year, entered_by) VALUES (?, ?, ?, ?)",
-                    (waste, month, year, session["user_id"])
-                )
-
-                cursor.execute(
-                    "INSERT INTO greenery_data (value, month, year, entered_by) VALUES (?, ?, ?, ?)",
-                    (greenery, month, year, session["user_id"])
-                )
-
-                # CALCULATE SCORE
-                energy_score = max(0, 100 - energy / 10)
-                water_score = max(0, 100 - water / 10)
-                waste_score = max(0, 100 - waste / 5)
-                greenery_score = min(100, greenery / 2)
-
-                total = round(
-                    (energy_score + water_score +
-                     waste_score + greenery_score) / 4, 2
-                )
-
-                total_scores.append(total)
-
-                # Remove old score if exists
-                cursor.execute(
-                    "DELETE FROM sustainability_scores WHERE month=? AND year=?",
-                    (month, year)
+        if file and file.filename.lower().endswith((".xlsx", ".csv")):
+            from ingest import save_upload, upload_status
+
+            path, file_hash = save_upload(file)
+
+            # Same content as an upload that already completed: skip it
+            # rather than queue a job that would change nothing
+            done = upload_status(get_db().cursor(), file_hash)
+            if done and done["status"] == "complete":
+                os.remove(path)
+                return render_template(
+                    "upload_sustainability_excel.html",
+                    job_id=None,
+                    duplicate=done["rows_done"],
+                    error=None
                 )
 
-                cursor.execute("""
-                    INSERT INTO sustainability_scores
-                    (month, year, energy_score, water_score,
-                     waste_score, greenery_score, total_score)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (month, year,
-                      energy_score, water_score,
-                      waste_score, greenery_score, total))
+            # Parsing and scoring run in the job queue; the page polls
+            # /jobs/<id> for progress and the result
+            job_id = enqueue("upload", {
+                "path": path,
+                "filename": file.filename,
+                "file_hash": file_hash,
+                "user_id": session["user_id"]
+            }, session["user_id"])
 
-            conn.commit()
-            conn.close()
+            return redirect(url_for("upload_sustainability_excel", job=job_id))
 
-            avg_uploaded = round(sum(total_scores) / len(total_scores), 2)
+        error = "Please upload an .xlsx or .csv file ❌"
 
     return render_template(
         "upload_sustainability_excel.html",
-        avg_uploaded=avg_uploaded
+        job_id=request.args.get("job", type=int),
+        error=error
     )
 
 # -------------------- PDF EXPORT --------------------
 
-@app.route("/export_pdf")
 def export_pdf():
     if "user_id" not in session:
         return redirect(url_for("login"))
 
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT month, year, total_score
-        FROM sustainability_scores
-        ORDER BY year, month
-    """)
-    rows = cursor.fetchall()
-    conn.close()
-
-    file_path = "report.pdf"
-    c = canvas.Canvas(file_path, pagesize=A4)
-    width, height = A4
-
-    y = height - 50
-    c.setFont("Helvetica", 12)
-    c.drawString(50, y, "Sustainability Report")
-    y -= 30
-
-    for r in rows:
-        c.drawString(
-            50, y,
-            f"Month: {r['month']}  Year: {r['year']}  Score: {r['total_score']}"
+    year = request.args.get("year", type=int)
+    generation = current_generation()
+
+    # Repeat downloads of the same data generation are served directly
+    pdf = cached_report(generation, year)
+    if pdf is not None:
+        return send_file(
+            io.BytesIO(pdf),
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name=f"sustainability_report_{year or 'all'}.pdf"
         )
-        y -= 20
 
-    c.save()
+    job_id = enqueue("report", {
+        "year": year,
+        "generation": generation
+    }, session["user_id"])
 
-    return send_file(file_path, as_attachment=True)
+    return render_template("report_status.html", job_id=job_id, year=year)
 
 
 # -------------------- ADMIN --------------------
 
-@app.route("/add_user", methods=["GET", "POST"])
 def add_user():
     if "user_id" not in session:
         return redirect(url_for("login"))
@@ -322,12 +273,11 @@ def add_user():
             error = "All fields are required ❌"
             return render_template("add_user.html", error=error)
 
-        conn = get_connection()
+        conn = get_db()
         cursor = conn.cursor()
 
         cursor.execute("SELECT id FROM users WHERE username=?", (username,))
         if cursor.fetchone():
-            conn.close()
             error = "Username already exists ❌"
             return render_template("add_user.html", error=error)
 
@@ -337,15 +287,43 @@ def add_user():
         """, (username, hash_password(password), role))
 
         conn.commit()
-        conn.close()
 
         return redirect(url_for("add_user"))
 
     return render_template("add_user.html", error=error)
 
 
+# -------------------- APP --------------------
+
+def create_app():
+    app = Flask(__name__, template_folder="templates")
+    app.secret_key = os.environ.get("SECRET_KEY", "dev_secret")
+
+    init_app(app)
+    instrumentation.init_app(app)
+    recalc.init_app(app)
+
+    app.register_blueprint(manageuser_bp)
+    app.register_blueprint(dataentry_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(campuses_bp)
+
+    app.add_url_rule("/", view_func=login, methods=["GET", "POST"])
+    app.add_url_rule("/logout", view_func=logout)
+    app.add_url_rule("/dashboard", view_func=dashboard)
+    app.add_url_rule("/upload_sustainability_excel", view_func=upload_sustainability_excel,
+                     methods=["GET", "POST"])
+    app.add_url_rule("/export_pdf", view_func=export_pdf)
+    app.add_url_rule("/add_user", view_func=add_user, methods=["GET", "POST"])
+
+    return app
+
+
+app = create_app()
+
+
 # -------------------- RUN --------------------
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)
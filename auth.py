@@ -0,0 +1,195 @@
+"""
+Password hashing and login verification.
+
+Hashes are salted scrypt (PBKDF2-SHA256 where the OpenSSL build lacks
+scrypt), stored with their parameters:
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+
+so the cost can be raised (SCRYPT_N, PBKDF2_ITERATIONS) without breaking
+existing passwords. Legacy unsalted SHA-256 hashes, and hashes made with
+older parameters, are rehashed on the user's next successful login.
+
+The slow hash only runs once per (user, password) while it stays in a
+bounded in-memory LRU of verified logins (AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+seconds). Entries are tied to the stored hash, so a password reset or
+rehash invalidates them; the cache key is an HMAC of the campus, user id
+and password with a per-process secret, so the passwords themselves are
+never kept.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from database import current_campus
+
+SCRYPT_N = int(os.environ.get("SCRYPT_N", 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = int(os.environ.get("PBKDF2_ITERATIONS", 600000))
+
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 1024))
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", 300))
+
+SALT_BYTES = 16
+HAS_SCRYPT = hasattr(hashlib, "scrypt")
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # scrypt needs 128 * r * n bytes; OpenSSL's default cap is 32 MB
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * r * n + 1024 * 1024)
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
+# ================= HASHING =================
+def hash_password(password):
+    salt = secrets.token_bytes(SALT_BYTES)
+    if HAS_SCRYPT:
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+    digest = _pbkdf2(password, salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(digest)}"
+
+
+def needs_rehash(stored):
+    if HAS_SCRYPT:
+        return stored.split("$")[:4] != ["scrypt", str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+    return stored.split("$")[:2] != ["pbkdf2_sha256", str(PBKDF2_ITERATIONS)]
+
+
+def verify_password(password, stored):
+    """True if `password` matches the stored hash, in any supported format."""
+    parts = stored.split("$")
+
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            n, r, p = (int(v) for v in parts[1:4])
+            digest = _scrypt(password, _unb64(parts[4]), n, r, p)
+            return hmac.compare_digest(digest, _unb64(parts[5]))
+
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            digest = _pbkdf2(password, _unb64(parts[2]), int(parts[1]))
+            return hmac.compare_digest(digest, _unb64(parts[3]))
+    except ValueError:
+        return False
+
+    if len(stored) == 64:
+        # Legacy unsalted SHA-256 hex digest
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+
+    return False
+
+
+# Verified against when the username does not exist, so unknown users take
+# as long as wrong passwords
+_DUMMY_HASH = None
+
+
+def _dummy_hash():
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None:
+        _DUMMY_HASH = hash_password(secrets.token_urlsafe())
+    return _DUMMY_HASH
+
+
+# ================= VERIFIED LOGIN CACHE =================
+class LoginCache:
+    def __init__(self, size=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._key = secrets.token_bytes(32)
+        self._entries = OrderedDict()  # key -> (stored hash, expires)
+        self._lock = threading.Lock()
+
+    def _entry_key(self, user_id, password):
+        # User ids are only unique within one campus's database
+        message = f"{current_campus()}:{user_id}:{password}".encode()
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def hit(self, user_id, password, stored):
+        key = self._entry_key(user_id, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry[0] != stored or entry[1] < time.monotonic():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, user_id, password, stored):
+        if self.size <= 0:
+            return
+        key = self._entry_key(user_id, password)
+        with self._lock:
+            self._entries[key] = (stored, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+login_cache = LoginCache()
+
+
+# ================= LOGIN =================
+USER_BY_NAME_SQL = "SELECT id, username, role, password_hash FROM users WHERE username=?"
+
+
+def authenticate(conn, username, password):
+    """
+    Returns the user's (id, username, role) row if the password is right,
+    else None. Outdated hashes are upgraded in place.
+    """
+    cursor = conn.cursor()
+    cursor.execute(USER_BY_NAME_SQL, (username,))
+    user = cursor.fetchone()
+
+    if user is None:
+        verify_password(password, _dummy_hash())
+        return None
+
+    stored = user["password_hash"]
+    if login_cache.hit(user["id"], password, stored):
+        return user
+
+    if not verify_password(password, stored):
+        return None
+
+    if needs_rehash(stored):
+        upgraded = hash_password(password)
+        # Only if nobody changed the password meanwhile
+        cursor.execute(
+            "UPDATE users SET password_hash=? WHERE id=? AND password_hash=?",
+            (upgraded, user["id"], stored)
+        )
+        conn.commit()
+        if cursor.rowcount:
+            stored = upgraded
+
+    login_cache.add(user["id"], password, stored)
+    return user
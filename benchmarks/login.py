@@ -0,0 +1,136 @@
+"""
+Login throughput benchmark.
+
+Creates users in a fresh database and measures, as JSON:
+  - the cost of one password hash at the configured parameters
+  - POST / latency with a cold verified-login cache (full hash) and a warm one
+  - the first login of a legacy SHA-256 user (verify + rehash)
+  - logins/s from several threads, cold and warm, through auth.authenticate
+
+    python -m benchmarks.login --users 50 --threads 8 --output login.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+from benchmarks.run import _git_commit, _peak_rss_mb, timed
+
+PASSWORD = "correct horse battery staple"
+
+
+def _throughput(authenticate, get_connection, usernames, threads):
+    def login(username):
+        conn = get_connection()
+        try:
+            assert authenticate(conn, username, PASSWORD) is not None
+        finally:
+            conn.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(login, usernames))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "logins": len(usernames),
+        "threads": threads,
+        "seconds": round(elapsed, 3),
+        "logins_per_second": round(len(usernames) / elapsed, 1)
+    }
+
+
+def run(args):
+    import database
+    database.DB_NAME = args.db
+
+    import auth
+    from app import app
+    from database import get_connection
+    from init_db import init_db
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        init_db(args.db)
+
+    conn = get_connection()
+    stored = auth.hash_password(PASSWORD)
+    usernames = [f"login_user_{i}" for i in range(args.users)]
+    conn.executemany(
+        "INSERT INTO users (username, password_hash, role) VALUES (?, ?, 'user')",
+        [(u, stored) for u in usernames]
+    )
+    legacy = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    conn.executemany(
+        "INSERT INTO users (username, password_hash, role) VALUES (?, ?, 'user')",
+        [(f"legacy_user_{i}", legacy) for i in range(args.iterations)]
+    )
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+
+    def post_login(username):
+        with client.session_transaction() as s:
+            s.clear()
+        response = client.post("/", data={"username": username, "password": PASSWORD})
+        assert response.status_code == 302, response.status_code
+
+    n = args.iterations
+    results = {
+        "hash_password": timed(lambda: auth.hash_password(PASSWORD), n),
+        "login_cold": timed(lambda: post_login(usernames[0]), n, setup=auth.login_cache.clear),
+        "login_warm": timed(lambda: post_login(usernames[0]), n),
+    }
+
+    legacy_users = iter(f"legacy_user_{i}" for i in range(n))
+    results["login_legacy_upgrade"] = timed(lambda: post_login(next(legacy_users)), n)
+
+    auth.login_cache.clear()
+    results["throughput_cold"] = _throughput(
+        auth.authenticate, get_connection, usernames, args.threads
+    )
+    results["throughput_warm"] = _throughput(
+        auth.authenticate, get_connection, usernames * args.repeat, args.threads
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="warm logins per user in the warm throughput run")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    fd, args.db = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    os.remove(args.db)
+
+    try:
+        report = {
+            "commit": _git_commit(),
+            "results": run(args),
+            "peak_rss_mb": _peak_rss_mb()
+        }
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark harness for the hot paths.
+
+Generates a synthetic database (or reuses --db), times each hot path and
+prints the results as JSON so runs can be compared between commits:
+
+    python -m benchmarks.run --years 2 --buildings 50 --output before.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generate import generate
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(fn, iterations, setup=None):
+    """Runs fn `iterations` times and returns latency percentiles in ms."""
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples = np.array(samples)
+    return {
+        "iterations": iterations,
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "max_ms": round(float(samples.max()), 3),
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+
+def _upload_file(rows, start_year):
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        "month": rng.integers(1, 13, rows),
+        "year": rng.integers(start_year, start_year + 2, rows),
+        "energy": rng.normal(800, 250, rows).round(2),
+        "water": rng.normal(700, 200, rows).round(2),
+        "waste": rng.normal(250, 80, rows).round(2),
+        "greenery": rng.normal(150, 50, rows).round(2),
+    })
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    df.to_csv(path, index=False)
+    return path
+
+
+def run(args):
+    import database
+    database.DB_NAME = args.db
+
+    from app import app
+    from cache import bump_generation
+    from database import get_connection
+    from dataentry import recalculate_month_score
+    from ingest import ingest_file
+    from reports import render_report
+
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["username"] = "admin"
+        s["role"] = "admin"
+
+    def get(path):
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+        response.close()
+
+    n = args.iterations
+    results = {}
+
+    results["dashboard_uncached"] = timed(lambda: get("/dashboard"), n, setup=bump_generation)
+    results["dashboard_cached"] = timed(lambda: get("/dashboard"), n)
+    results["view_entries"] = timed(lambda: get("/data/view_entries"), n)
+    results["view_entries_year"] = timed(
+        lambda: get(f"/data/view_entries?year={args.start_year}"), n
+    )
+    results["manage_users"] = timed(lambda: get("/manage_users"), n)
+
+    with app.app_context():
+        results["recalculate_month_score"] = timed(
+            lambda: recalculate_month_score(1, args.start_year), n
+        )
+
+    conn = get_connection()
+    results["export_pdf"] = timed(lambda: render_report(conn), max(1, n // 5))
+
+    path = _upload_file(args.upload_rows, args.start_year)
+    try:
+        # Unique hash per run so upload_progress never short-circuits it
+        started = time.perf_counter()
+        stats = ingest_file(conn, path, "bench.csv", f"bench-{time.time_ns()}", 1)
+        elapsed = time.perf_counter() - started
+    finally:
+        os.remove(path)
+        conn.close()
+
+    results["upload_sustainability_excel"] = {
+        "rows": stats["rows"],
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(stats["rows"] / elapsed),
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", help="existing benchmark database (generated if omitted)")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--buildings", type=int, default=20)
+    parser.add_argument("--readings-per-month", type=int, default=24)
+    parser.add_argument("--start-year", type=int, default=2015)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--upload-rows", type=int, default=20000)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    scale = None
+    cleanup = None
+    if not args.db:
+        fd, args.db = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.remove(args.db)
+        cleanup = args.db
+        scale = generate(
+            args.db, args.years, args.buildings,
+            args.readings_per_month, args.start_year
+        )
+
+    try:
+        report = {
+            "commit": _git_commit(),
+            "scale": scale,
+            "results": run(args),
+            "peak_rss_mb": _peak_rss_mb()
+        }
+    finally:
+        if cleanup:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(cleanup + suffix):
+                    os.remove(cleanup + suffix)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Startup benchmark.
+
+Imports each module in a fresh interpreter (as a gunicorn worker boot or a
+CLI invocation would), records import time and resident memory, lists the
+heavy libraries that got loaded, and times the app's first /dashboard
+request. Prints JSON so runs can be compared between commits:
+
+    python -m benchmarks.startup --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.generate import generate
+from benchmarks.run import _git_commit
+
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "reportlab", "pyarrow")
+
+DEFAULT_MODULES = ("app", "init_db", "aggregates", "api_tokens")
+
+PROBE = """
+import json, sys, time
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+
+started = time.perf_counter()
+import {module}
+result = {{
+    "import_ms": (time.perf_counter() - started) * 1000,
+    "rss_mb": rss_mb(),
+    "heavy": [m for m in {heavy!r} if m in sys.modules]
+}}
+
+if {first_request!r}:
+    client = {module}.app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = 1
+        s["username"] = "admin"
+        s["role"] = "admin"
+
+    started = time.perf_counter()
+    response = client.get("/dashboard")
+    assert response.status_code == 200, response.status_code
+    result["first_dashboard_ms"] = (time.perf_counter() - started) * 1000
+    result["rss_after_dashboard_mb"] = rss_mb()
+    result["heavy_after_dashboard"] = [m for m in {heavy!r} if m in sys.modules]
+
+print(json.dumps(result))
+"""
+
+
+def probe(module, db, first_request=False):
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES, first_request=first_request)
+    env = dict(os.environ, SUSTAINABILITY_DB=db, PYTHONDONTWRITEBYTECODE="1")
+    output = subprocess.check_output([sys.executable, "-c", code], env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _summary(samples, key):
+    values = np.array([s[key] for s in samples])
+    return {
+        "p50": round(float(np.percentile(values, 50)), 1),
+        "p95": round(float(np.percentile(values, 95)), 1),
+        "max": round(float(values.max()), 1)
+    }
+
+
+def run(args):
+    results = {}
+    for module in args.module or DEFAULT_MODULES:
+        first_request = module == "app"
+        samples = [probe(module, args.db, first_request) for _ in range(args.runs)]
+
+        result = {
+            "runs": args.runs,
+            "import_ms": _summary(samples, "import_ms"),
+            "rss_mb": _summary(samples, "rss_mb"),
+            "heavy_modules": samples[-1]["heavy"]
+        }
+        if first_request:
+            result["first_dashboard_ms"] = _summary(samples, "first_dashboard_ms")
+            result["rss_after_dashboard_mb"] = _summary(samples, "rss_after_dashboard_mb")
+            result["heavy_after_dashboard"] = samples[-1]["heavy_after_dashboard"]
+        results[module] = result
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", help="existing database (a small one is generated if omitted)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", action="append",
+                        help=f"module to import (repeatable, default: {', '.join(DEFAULT_MODULES)})")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    cleanup = None
+    if not args.db:
+        fd, args.db = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.remove(args.db)
+        cleanup = args.db
+        generate(args.db, years=1, buildings=5, readings_per_month=4)
+
+    try:
+        report = {
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "results": run(args)
+        }
+    finally:
+        if cleanup:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(cleanup + suffix):
+                    os.remove(cleanup + suffix)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Generation-keyed cache for computed page payloads.
+
+Every write path calls bump_generation() after it commits; cached payloads
+are stored under the generation they were computed at, so a bump
+invalidates everything at once without touching the database.
+
+Each campus has its own generation and payloads (the campus defaults to
+database.current_campus()), so a write to one campus never invalidates
+another's pages.
+
+By default the counter and payloads live in this process, which is only
+correct with a single worker. Set DASHBOARD_CACHE_DIR to share them between
+gunicorn workers through files on disk (one subdirectory per non-default
+campus).
+
+Scripts that write outside the web app (rescore.py) cannot reach either of
+those, so each campus database also keeps a cache_generation counter that
+they bump in the same transaction as their writes. current_generation()
+adds it to the local generation; both only ever grow, so a bump on either
+side changes the sum. The counter is re-read at most every
+STORED_GENERATION_TTL seconds, so repeat page loads (304s) still skip the
+database; offline writes show up within that delay.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from database import DEFAULT_CAMPUS, current_campus, get_connection, get_db
+
+CACHE_DIR = os.environ.get("DASHBOARD_CACHE_DIR")
+STORED_GENERATION_TTL = float(os.environ.get("STORED_GENERATION_TTL", 2))
+
+_lock = threading.Lock()
+# campus -> generation, seeded per process so ETags issued before a
+# restart never match
+_generations = {}
+_memory = {}
+# campus -> (time.monotonic() of the read, stored generation)
+_stored = {}
+
+
+def _campus_dir(campus):
+    if campus == DEFAULT_CAMPUS:
+        return CACHE_DIR
+    return os.path.join(CACHE_DIR, campus)
+
+
+def _generation_path(campus):
+    return os.path.join(_campus_dir(campus), "generation")
+
+
+def _payload_path(campus, key, generation):
+    return os.path.join(_campus_dir(campus), f"{key}-{generation}.json")
+
+
+# ================= STORED GENERATION =================
+def bump_stored_generation(cursor):
+    """For writers outside the web app; call before committing the write."""
+    cursor.execute("UPDATE cache_generation SET generation = generation + 1 WHERE id = 1")
+
+
+def stored_generation(campus=None):
+    campus = campus or current_campus()
+    now = time.monotonic()
+    read_at, generation = _stored.get(campus, (None, 0))
+    if read_at is not None and now - read_at < STORED_GENERATION_TTL:
+        return generation
+
+    own = campus == current_campus()
+    conn = get_db() if own else get_connection(campus)
+    try:
+        row = conn.execute("SELECT generation FROM cache_generation WHERE id = 1").fetchone()
+        generation = row[0] if row else 0
+    except sqlite3.OperationalError:
+        # Database from before the table existed (python init_db.py adds it)
+        generation = 0
+    finally:
+        if not own:
+            conn.close()
+
+    with _lock:
+        _stored[campus] = (now, generation)
+    return generation
+
+
+# ================= GENERATIONS =================
+def current_generation(campus=None):
+    campus = campus or current_campus()
+    return _local_generation(campus) + stored_generation(campus)
+
+
+def _local_generation(campus):
+    if not CACHE_DIR:
+        with _lock:
+            return _generations.setdefault(campus, time.time_ns())
+
+    try:
+        with open(_generation_path(campus)) as f:
+            return int(f.read() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def bump_generation(campus=None):
+    campus = campus or current_campus()
+
+    with _lock:
+        _generations[campus] = _generations.get(campus, time.time_ns()) + 1
+        for stale in [k for k in _memory if k[0] == campus]:
+            del _memory[stale]
+
+    if CACHE_DIR:
+        import fcntl
+
+        directory = _campus_dir(campus)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "generation.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            generation = _local_generation(campus) + 1
+            tmp = _generation_path(campus) + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(str(generation))
+            os.replace(tmp, _generation_path(campus))
+
+        # Payloads from older generations can never be served again
+        current = generation + stored_generation(campus)
+        for name in os.listdir(directory):
+            if name.endswith(".json") and not name.endswith(f"-{current}.json"):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+def get_cached(key, generation, campus=None):
+    campus = campus or current_campus()
+    payload = _memory.get((campus, key, generation))
+    if payload is not None or not CACHE_DIR:
+        return payload
+
+    try:
+        with open(_payload_path(campus, key, generation)) as f:
+            payload = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    _memory[(campus, key, generation)] = payload
+    return payload
+
+
+def set_cached(key, generation, payload, campus=None):
+    campus = campus or current_campus()
+
+    with _lock:
+        # Keep only each campus's latest generation in memory
+        for stale in [k for k in _memory if k[0] == campus and k[2] != generation]:
+            del _memory[stale]
+        _memory[(campus, key, generation)] = payload
+
+    if CACHE_DIR:
+        os.makedirs(_campus_dir(campus), exist_ok=True)
+        path = _payload_path(campus, key, generation)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
@@ -0,0 +1,144 @@
+"""
+Campuses and cross-campus comparison.
+
+Every campus is a separate SQLite database (database.campus_path()), so a
+campus's dashboard, uploads and indexes only ever touch its own rows. The
+comparison view never scans readings either: it ATTACHes the campus files
+read-only, a few at a time, and reads each one's rollups, which the
+triggers in init_db.py already keep current:
+
+    score_trend           running sums -> average score
+    sustainability_scores latest scored month (unique (year, month) index)
+    monthly_aggregates    per-metric sums and counts -> average reading
+
+    python campuses.py create north    # campuses/north.db with the schema
+    python campuses.py list            # rollups of every campus
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from urllib.parse import quote
+
+from flask import Blueprint, redirect, render_template, session, url_for
+
+from aggregates import DATA_TABLES
+from database import CAMPUS_DIR, DEFAULT_CAMPUS, campus_path, list_campuses
+from instrumentation import connection_factory
+
+campuses_bp = Blueprint("campuses", __name__)
+
+# SQLite attaches at most 10 databases per connection by default
+ATTACH_BATCH = 8
+
+
+def _rollup_sql(schema):
+    averages = ",\n".join(
+        f"(SELECT SUM(value_sum) / SUM(value_count) FROM {schema}.monthly_aggregates "
+        f"WHERE table_name='{table}') AS {table.replace('_data', '')}"
+        for table in DATA_TABLES
+    )
+    return f"""
+        SELECT ? AS campus,
+        (SELECT n FROM {schema}.score_trend WHERE id=1) AS months,
+        (SELECT sum_y / n FROM {schema}.score_trend WHERE id=1 AND n > 0) AS average_score,
+        latest.year AS latest_year, latest.month AS latest_month,
+        latest.total_score AS latest_score,
+        {averages}
+        FROM (SELECT 1)
+        LEFT JOIN (
+            SELECT year, month, total_score FROM {schema}.sustainability_scores
+            WHERE total_score IS NOT NULL
+            ORDER BY year DESC, month DESC LIMIT 1
+        ) AS latest
+    """
+
+
+def compare_campuses(campuses=None):
+    """
+    One rollup dict per campus (default: every campus), from each campus's
+    aggregate tables. Campuses without a database file are left out.
+    """
+    campuses = [c for c in campuses or list_campuses() if os.path.exists(campus_path(c))]
+
+    conn = sqlite3.connect(":memory:", uri=True, factory=connection_factory())
+    conn.row_factory = sqlite3.Row
+    rows = []
+
+    try:
+        for start in range(0, len(campuses), ATTACH_BATCH):
+            batch = campuses[start:start + ATTACH_BATCH]
+            schemas = [f"c{i}" for i in range(len(batch))]
+
+            for campus, schema in zip(batch, schemas):
+                uri = "file:" + quote(os.path.abspath(campus_path(campus))) + "?mode=ro"
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (uri,))
+            try:
+                sql = "\nUNION ALL\n".join(_rollup_sql(schema) for schema in schemas)
+                rows += [dict(r) for r in conn.execute(sql, batch)]
+            finally:
+                for schema in schemas:
+                    conn.execute(f"DETACH DATABASE {schema}")
+    finally:
+        conn.close()
+
+    for row in rows:
+        for key in ("average_score", "latest_score", "energy", "water", "waste", "greenery"):
+            if row[key] is not None:
+                row[key] = round(row[key], 2)
+        row["months"] = row["months"] or 0
+    return rows
+
+
+# ================= ROUTES =================
+@campuses_bp.route("/campuses")
+def compare():
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    if session["role"] != "admin":
+        return "Access Denied ❌"
+
+    return render_template(
+        "campuses.html",
+        rows=compare_campuses(),
+        current=session.get("campus", DEFAULT_CAMPUS)
+    )
+
+
+# ================= CLI =================
+def main():
+    parser = argparse.ArgumentParser(description="Manage campus databases")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    create = sub.add_parser("create")
+    create.add_argument("name")
+
+    sub.add_parser("list")
+
+    args = parser.parse_args()
+
+    if args.command == "create":
+        try:
+            path = campus_path(args.name)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+
+        from init_db import init_db
+
+        os.makedirs(CAMPUS_DIR, exist_ok=True)
+        init_db(path)
+        print(f"✅ Campus {args.name} ready in {path}")
+        return 0
+
+    for row in compare_campuses():
+        latest = (f"{row['latest_month']}-{row['latest_year']}: {row['latest_score']}"
+                  if row["latest_score"] is not None else "no scores")
+        print(f"{row['campus']:<20} {row['months']:>5} months  "
+              f"avg {row['average_score']}  latest {latest}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
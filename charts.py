@@ -0,0 +1,192 @@
+"""
+Chart series for the dashboard.
+
+Each series (the total score, or a component's monthly average reading,
+optionally for one building's meters) is built once per data generation
+at monthly, quarterly and yearly resolution and cached. Requests then only
+slice the cached arrays to a range and, when that range holds more points
+than the chart can draw, downsample with LTTB (largest triangle three
+buckets), which keeps the visual peaks and troughs of the line.
+"""
+import numpy as np
+
+from cache import current_generation, get_cached, set_cached
+from forecast import EPOCH_YEAR, month_index, month_label
+
+RESOLUTIONS = ("monthly", "quarterly", "yearly")
+SERIES = ("score", "energy", "water", "waste", "greenery")
+
+DEFAULT_POINTS = 120
+MAX_POINTS = 2000
+# LTTB keeps the first and last point plus at least one bucket between them
+MIN_POINTS = 3
+
+
+# ================= DOWNSAMPLING =================
+def lttb(x, y, threshold):
+    """
+    Indices of the `threshold` points that best preserve the shape of the
+    (x, y) line. Always keeps the first and last point; thresholds below
+    MIN_POINTS are raised to it.
+    """
+    n = len(x)
+    threshold = max(threshold, MIN_POINTS)
+    if threshold >= n:
+        return np.arange(n)
+
+    bucket = (n - 2) / (threshold - 2)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    a = 0
+
+    for i in range(threshold - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        next_end = min(int((i + 2) * bucket) + 1, n)
+
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+
+    keep[-1] = n - 1
+    return keep
+
+
+# ================= SERIES =================
+SCORE_SERIES_SQL = """
+    SELECT year, month, total_score AS value FROM sustainability_scores
+    WHERE total_score IS NOT NULL
+    ORDER BY year, month
+"""
+
+# One building's metered monthly totals: (building, metric)
+BUILDING_SERIES_SQL = """
+    SELECT mm.year, mm.month, SUM(mm.value_sum) AS value
+    FROM meter_monthly mm
+    JOIN meters m ON m.id = mm.meter_id
+    JOIN buildings b ON b.id = m.building_id
+    WHERE b.name=? AND m.metric=? AND mm.value_count > 0
+    GROUP BY mm.year, mm.month
+    ORDER BY mm.year, mm.month
+"""
+
+# A component's monthly average reading: (table_name,)
+COMPONENT_SERIES_SQL = """
+    SELECT year, month, value_sum / value_count AS value
+    FROM monthly_aggregates
+    WHERE table_name=? AND value_count > 0
+    ORDER BY year, month
+"""
+
+
+def _monthly(cursor, series, building=None):
+    if series == "score":
+        cursor.execute(SCORE_SERIES_SQL)
+    elif building:
+        cursor.execute(BUILDING_SERIES_SQL, (building, series))
+    else:
+        cursor.execute(COMPONENT_SERIES_SQL, (f"{series}_data",))
+
+    rows = cursor.fetchall()
+    x = np.array([month_index(r["year"], r["month"]) for r in rows], dtype=np.int64)
+    y = np.array([r["value"] for r in rows], dtype=np.float64)
+    return x, y
+
+
+def _rollup(x, y, months):
+    """Averages monthly points into periods of `months` months."""
+    period = x // months
+    keys, inverse = np.unique(period, return_inverse=True)
+    means = np.bincount(inverse, weights=y) / np.bincount(inverse)
+    return keys * months, means
+
+
+def build_series(cursor, series, building=None):
+    """All resolutions of one series as plain lists (cacheable as JSON)."""
+    x, y = _monthly(cursor, series, building)
+    built = {"monthly": (x, y)}
+    built["quarterly"] = _rollup(x, y, 3)
+    built["yearly"] = _rollup(x, y, 12)
+    return {
+        res: {"x": xs.tolist(), "y": np.round(ys, 2).tolist()}
+        for res, (xs, ys) in built.items()
+    }
+
+
+def cached_series(cursor, series, building=None):
+    if series == "score":
+        building = None  # scores are campus-wide
+
+    generation = current_generation()
+    key = f"chart-{series}-{building or ''}"
+
+    payload = get_cached(key, generation)
+    if payload is None:
+        payload = build_series(cursor, series, building)
+        set_cached(key, generation, payload)
+    return payload
+
+
+def _label(index, resolution):
+    year, month = divmod(int(index), 12)
+    if resolution == "yearly":
+        return str(year + EPOCH_YEAR)
+    if resolution == "quarterly":
+        return f"Q{month // 3 + 1}-{year + EPOCH_YEAR}"
+    return month_label(int(index))
+
+
+def chart_series(cursor, series="score", resolution="auto", start=None, end=None,
+                 points=DEFAULT_POINTS, building=None):
+    """
+    Points to draw for a series between two month indexes. "auto" picks the
+    finest resolution that fits in `points`; any resolution is downsampled
+    with LTTB when the range still has more points than that.
+    """
+    resolutions = cached_series(cursor, series, building)
+
+    candidates = RESOLUTIONS if resolution == "auto" else (resolution,)
+    for res in candidates:
+        x = np.asarray(resolutions[res]["x"], dtype=np.int64)
+        y = np.asarray(resolutions[res]["y"], dtype=np.float64)
+
+        mask = np.ones(len(x), dtype=bool)
+        if start is not None:
+            mask &= x >= start
+        if end is not None:
+            mask &= x <= end
+        x, y = x[mask], y[mask]
+
+        if len(x) <= points:
+            break
+
+    total = len(x)
+    keep = lttb(x.astype(np.float64), y, points)
+    x, y = x[keep], y[keep]
+
+    return {
+        "series": series,
+        "resolution": res,
+        "labels": [_label(i, res) for i in x],
+        "values": y.tolist(),
+        "points": len(x),
+        "total_points": total,
+        "downsampled": len(x) < total
+    }
+
+
+def parse_month(value):
+    """'2021-03' -> month index, or None if it is not a valid month."""
+    try:
+        year, month = (int(p) for p in value.split("-"))
+    except (AttributeError, ValueError):
+        return None
+    if not 1 <= month <= 12:
+        return None
+    return month_index(year, month)
@@ -1,13 +1,140 @@
+import os
+import re
 import sqlite3
+import threading
+from contextlib import contextmanager
 
-DB_NAME = "sustainability_analytics.db"
+from flask import g, has_app_context, has_request_context, session
 
-def get_connection():
+from instrumentation import connection_factory
+
+DB_NAME = os.environ.get("SUSTAINABILITY_DB", "sustainability_analytics.db")
+
+# Each campus is its own SQLite file, so a campus's queries, indexes and
+# write lock only ever cover its own rows. The default campus is DB_NAME;
+# the others live in CAMPUS_DIR/<campus>.db (python campuses.py create x).
+DEFAULT_CAMPUS = "default"
+CAMPUS_DIR = os.environ.get("CAMPUS_DIR", "campuses")
+CAMPUS_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+# Applied to every new connection. WAL lets /dashboard keep reading while an
+# upload holds the write lock; synchronous=NORMAL is durable under WAL and
+# avoids an fsync per commit.
+PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -20000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+)
+
+_local = threading.local()
+
+
+# ================= CAMPUSES =================
+def campus_path(campus=None):
+    campus = campus or current_campus()
+    if campus == DEFAULT_CAMPUS:
+        return DB_NAME
+    if not CAMPUS_NAME.match(campus):
+        raise ValueError(f"Invalid campus name: {campus!r}")
+    return os.path.join(CAMPUS_DIR, f"{campus}.db")
+
+
+def list_campuses():
+    """The default campus plus every initialised file in CAMPUS_DIR."""
+    campuses = [DEFAULT_CAMPUS]
+    if os.path.isdir(CAMPUS_DIR):
+        campuses += sorted(
+            name[:-3] for name in os.listdir(CAMPUS_DIR)
+            if name.endswith(".db") and CAMPUS_NAME.match(name[:-3])
+            and name[:-3] != DEFAULT_CAMPUS
+        )
+    return campuses
+
+
+@contextmanager
+def use_campus(campus):
+    """Points get_connection()/get_db() in this thread at `campus`."""
+    previous = getattr(_local, "campus", None)
+    _local.campus = campus
+    try:
+        yield
+    finally:
+        _local.campus = previous
+
+
+def current_campus():
     """
-    Creates and returns a database connection.
+    The campus this thread is working for: an explicit use_campus(), then
+    the API request's campus (g.campus), then the logged-in session's, then
+    the CAMPUS environment variable.
+    """
+    campus = getattr(_local, "campus", None)
+    if campus:
+        return campus
+    if has_app_context() and g.get("campus"):
+        return g.campus
+    if has_request_context() and session.get("campus"):
+        return session["campus"]
+    return os.environ.get("CAMPUS", DEFAULT_CAMPUS)
+
+
+# ================= CONNECTIONS =================
+def get_connection(campus=None):
+    """
+    Creates and returns a new database connection to the current campus
+    (or `campus`).
     timeout=10 prevents 'database is locked' errors.
+    Use get_db() inside requests; this is for scripts and background work
+    that own the connection and close it themselves.
+    Statements are timed by instrumentation.py unless METRICS=0.
     """
-    conn = sqlite3.connect(DB_NAME, timeout=10)
+    return connect(campus_path(campus))
+
+
+def connect(path):
+    """get_connection() for an explicit database file."""
+    conn = sqlite3.connect(path, timeout=10, factory=connection_factory())
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_db():
+    """
+    Returns the connection for the current request, opening it on first use.
+    It is closed by close_db() when the app context tears down.
+    Outside an app context a per-thread connection is reused instead.
+    Either way the connection belongs to current_campus().
+    """
+    campus = current_campus()
+
+    if has_app_context():
+        if "db" in g and g.db_campus != campus:
+            close_db()
+        if "db" not in g:
+            g.db = get_connection(campus)
+            g.db_campus = campus
+        return g.db
+
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(campus)
+    if conn is None:
+        conn = connections[campus] = get_connection(campus)
     return conn
+
+
+def close_db(exc=None):
+    g.pop("db_campus", None)
+    conn = g.pop("db", None)
+    if conn is not None:
+        conn.close()
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
@@ -1,20 +1,20 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session
-from database import get_connection
-import pandas as pd
+from database import get_db
+from cache import bump_generation
+from recalc import mark_dirty
 
 dataentry_bp = Blueprint("dataentry", __name__, url_prefix="/data")
 
 
 # ================= COMMON INSERT FUNCTION =================
 def insert_record(table, value, month, year, user_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
+    conn = get_db()
+    conn.execute(
         f"INSERT INTO {table} (value, month, year, entered_by) VALUES (?, ?, ?, ?)",
         (value, month, year, user_id)
     )
     conn.commit()
-    conn.close()
+    bump_generation()
 
 
 # ================= ENERGY =================
@@ -100,71 +100,49 @@ ALLOWED_TABLES = {
     "greenery_data"
 }
 
-def recalculate_month_score(month, year):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    def get_avg(table):
-        cursor.execute("""
-            SELECT AVG(value) as avg
-            FROM {}
-            WHERE month=? AND year=?
-        """.format(table), (month, year))
-        result = cursor.fetchone()["avg"]
-        return result if result else 0
-
-    energy = get_avg("energy_data")
-    water = get_avg("water_data")
-    waste = get_avg("waste_data")
-    greenery = get_avg("greenery_data")
-
-    # Score logic (same as upload)
-    energy_score = max(0, 100 - energy / 10)
-    water_score = max(0, 100 - water / 10)
-    waste_score = max(0, 100 - waste / 5)
-    greenery_score = min(100, greenery / 2)
-
-    total = round(
-        (energy_score + water_score +
-         waste_score + greenery_score) / 4, 2
-    )
+# Month and year of one entry, read before it is edited or deleted
+ENTRY_MONTH_SQL = "SELECT month, year FROM {table} WHERE id=?"
 
-    # Remove old score
-    cursor.execute("""
-        DELETE FROM sustainability_scores
-        WHERE month=? AND year=?
-    """, (month, year))
-
-    # Insert new score
-    cursor.execute("""
-        INSERT INTO sustainability_scores
-        (month, year, energy_score, water_score,
-         waste_score, greenery_score, total_score)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (month, year,
-          energy_score, water_score,
-          waste_score, greenery_score, total))
+def recalculate_month_score(month, year):
+    conn = get_db()
+    from scoring import score_month
 
+    score_month(conn.cursor(), month, year)
     conn.commit()
-    conn.close()
 
 # 
 # ---------------- VIEW ENTRIES ----------------
-@dataentry_bp.route("/view_entries")
-def view_entries():
-    if "user_id" not in session:
-        return redirect(url_for("login"))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
-    table = request.args.get("type", "energy_data")
-    month = request.args.get("month")
-    year = request.args.get("year")
 
-    if table not in ALLOWED_TABLES:
-        table = "energy_data"
+def parse_page_size(raw, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        size = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
 
-    conn = get_connection()
-    cursor = conn.cursor()
 
+def encode_cursor(row):
+    return f"{row['year']}:{row['month']}:{row['id']}"
+
+
+def decode_cursor(token):
+    """Returns (year, month, id) from a page cursor, or None if invalid."""
+    try:
+        year, month, id = (int(p) for p in token.split(":"))
+    except (AttributeError, ValueError):
+        return None
+    return year, month, id
+
+
+def entries_query(table, month=None, year=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Keyset (seek) pagination over (year, month, id), newest first.
+    `after` is the (year, month, id) of the last row on the previous page,
+    so every page is an index range read no matter how deep it is.
+    """
     query = f"""
         SELECT t.id, t.value, t.month, t.year, u.username
         FROM {table} t
@@ -182,19 +160,51 @@ def view_entries():
         query += " AND t.year=?"
         params.append(year)
 
-    query += " ORDER BY t.year DESC, t.month DESC"
+    if after:
+        query += " AND (t.year, t.month, t.id) < (?, ?, ?)"
+        params.extend(after)
+
+    query += " ORDER BY t.year DESC, t.month DESC, t.id DESC LIMIT ?"
+    params.append(limit)
+
+    return query, params
+
+
+@dataentry_bp.route("/view_entries")
+def view_entries():
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    table = request.args.get("type", "energy_data")
+    month = request.args.get("month")
+    year = request.args.get("year")
+    per_page = parse_page_size(request.args.get("per_page"))
+    after = decode_cursor(request.args.get("after"))
+
+    if table not in ALLOWED_TABLES:
+        table = "energy_data"
+
+    cursor = get_db().cursor()
 
+    # One extra row tells us whether there is a next page
+    query, params = entries_query(table, month, year, after, per_page + 1)
     cursor.execute(query, params)
     entries = cursor.fetchall()
 
-    conn.close()
+    next_cursor = None
+    if len(entries) > per_page:
+        entries = entries[:per_page]
+        next_cursor = encode_cursor(entries[-1])
 
     return render_template(
         "view_entries.html",
         entries=entries,
         selected_table=table,
         selected_month=month,
-        selected_year=year
+        selected_year=year,
+        per_page=per_page,
+        is_first_page=after is None,
+        next_cursor=next_cursor
     )
 
 
@@ -206,24 +216,20 @@ def delete_entry(table, id):
     if table not in ALLOWED_TABLES:
         return "Invalid table ❌"
 
-    conn = get_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Get month & year before deleting
-    cursor.execute(f"SELECT month, year FROM {table} WHERE id=?", (id,))
+    cursor.execute(ENTRY_MONTH_SQL.format(table=table), (id,))
     row = cursor.fetchone()
 
     if row:
-        month = row["month"]
-        year = row["year"]
-
         cursor.execute(f"DELETE FROM {table} WHERE id=?", (id,))
         conn.commit()
 
-        # Recalculate after delete
-        recalculate_month_score(month, year)
-
-    conn.close()
+        # Rescored once per month after the request, however many deletes
+        mark_dirty(row["month"], row["year"])
+        bump_generation()
 
     return redirect(url_for("dataentry.view_entries", type=table))
 
@@ -235,7 +241,7 @@ def edit_entry(table, id):
     if table not in ALLOWED_TABLES:
         return "Invalid table ❌"
 
-    conn = get_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == "POST":
@@ -243,27 +249,101 @@ def edit_entry(table, id):
         month = request.form["month"]
         year = request.form["year"]
 
+        cursor.execute(ENTRY_MONTH_SQL.format(table=table), (id,))
+        old = cursor.fetchone()
+
+        # A reading moved to another month is no longer its upload's row
+        # for that month (see ingest.UPSERT_UPLOAD_SQL)
         cursor.execute(f"""
             UPDATE {table}
-            SET value=?, month=?, year=?
+            SET value=?, month=?, year=?,
+                upload_row=CASE WHEN month=? AND year=? THEN upload_row END
             WHERE id=?
-        """, (value, month, year, id))
-
+        """, (value, month, year, month, year, id))
         conn.commit()
 
-        # Recalculate after edit
-        recalculate_month_score(month, year)
-
-        conn.close()
+        # Both the month the entry left and the one it moved to change
+        if old:
+            mark_dirty(old["month"], old["year"])
+        mark_dirty(month, year)
+        bump_generation()
 
         return redirect(url_for("dataentry.view_entries", type=table))
 
     cursor.execute(f"SELECT * FROM {table} WHERE id=?", (id,))
     entry = cursor.fetchone()
-    conn.close()
 
     return render_template(
         "edit_entry.html",
         entry=entry,
         table=table
     )
+
+
+# ---------------- BULK EDIT / DELETE ----------------
+def _affected_months(cursor, table, ids):
+    placeholders = ",".join("?" * len(ids))
+    cursor.execute(
+        f"SELECT DISTINCT month, year FROM {table} WHERE id IN ({placeholders})",
+        ids
+    )
+    return [(r["month"], r["year"]) for r in cursor.fetchall()]
+
+
+@dataentry_bp.route("/bulk_entries/<table>", methods=["POST"])
+def bulk_entries(table):
+    """
+    Deletes or edits every selected entry in one transaction. Blank edit
+    fields leave that column unchanged. Each affected month is rescored once.
+    """
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    if table not in ALLOWED_TABLES:
+        return "Invalid table ❌"
+
+    try:
+        ids = [int(i) for i in request.form.getlist("ids")]
+    except ValueError:
+        return "Invalid entry id ❌"
+
+    action = request.form.get("action")
+    if action not in ("delete", "edit"):
+        return "Invalid bulk action ❌"
+
+    if ids:
+        conn = get_db()
+        cursor = conn.cursor()
+        months = _affected_months(cursor, table, ids)
+
+        if action == "delete":
+            cursor.executemany(f"DELETE FROM {table} WHERE id=?", [(i,) for i in ids])
+        else:
+            fields = {
+                f: request.form.get(f) or None for f in ("value", "month", "year")
+            }
+            cursor.executemany(f"""
+                UPDATE {table}
+                SET value=COALESCE(:value, value),
+                    month=COALESCE(:month, month),
+                    year=COALESCE(:year, year),
+                    upload_row=CASE
+                        WHEN month=COALESCE(:month, month) AND year=COALESCE(:year, year)
+                        THEN upload_row
+                    END
+                WHERE id=:id
+            """, [{**fields, "id": i} for i in ids])
+            months += _affected_months(cursor, table, ids)
+
+        conn.commit()
+
+        for month, year in months:
+            mark_dirty(month, year)
+        bump_generation()
+
+    return redirect(url_for(
+        "dataentry.view_entries",
+        type=table,
+        month=request.form.get("filter_month") or None,
+        year=request.form.get("filter_year") or None
+    ))
@@ -0,0 +1,234 @@
+"""
+Score forecasting.
+
+score_trend holds running least-squares sums (n, Σx, Σy, Σxy, Σx², Σy²)
+over sustainability_scores, kept current by the triggers created in
+init_db.py, so the dashboard's next-month prediction is O(1). x is the
+calendar month index, so gaps in the history are respected.
+
+The richer models (seasonal baseline, exponentially weighted trend and a
+confidence band) need the whole series; they are fitted in a background
+thread once per campus and data generation and served from the cache. Run
+this module to rebuild score_trend for an existing database:
+
+    python forecast.py
+"""
+import logging
+import math
+import threading
+
+from cache import current_generation, get_cached, set_cached
+from database import current_campus, get_connection, use_campus
+from snapshot import load_scores
+
+EPOCH_YEAR = 2000
+
+# Holt's linear smoothing factors for the level and the trend
+EWMA_ALPHA = 0.5
+EWMA_BETA = 0.3
+
+# 95% prediction interval
+BAND_Z = 1.96
+
+# Reads of the score history shared by the dashboard, charts and models
+TREND_SUMS_SQL = "SELECT n, sum_x, sum_y, sum_xy, sum_xx FROM score_trend WHERE id=1"
+TREND_AVERAGE_SQL = "SELECT n, sum_y FROM score_trend WHERE id=1"
+LATEST_SCORE_SQL = """
+    SELECT year, month, total_score FROM sustainability_scores
+    WHERE total_score IS NOT NULL
+    ORDER BY year DESC, month DESC
+    LIMIT 1
+"""
+SCORE_HISTORY_SQL = """
+    SELECT year, month, total_score FROM sustainability_scores
+    WHERE total_score IS NOT NULL
+    ORDER BY year, month
+"""
+
+_fit_lock = threading.Lock()
+_fitting = set()
+
+logger = logging.getLogger(__name__)
+
+
+def month_index(year, month):
+    return (year - EPOCH_YEAR) * 12 + month - 1
+
+
+def month_label(index):
+    year, month = divmod(index, 12)
+    return f"{month + 1}-{year + EPOCH_YEAR}"
+
+
+# SQL form of month_index(), used by the score_trend triggers
+MONTH_INDEX_SQL = "(({row}.year - %d) * 12 + {row}.month - 1)" % EPOCH_YEAR
+
+
+def rebuild_trend_stats(conn):
+    x = MONTH_INDEX_SQL.format(row="s")
+    conn.execute(f"""
+        INSERT OR REPLACE INTO score_trend
+            (id, n, sum_x, sum_y, sum_xy, sum_xx, sum_yy)
+        SELECT 1, COUNT(*),
+               COALESCE(SUM({x}), 0),
+               COALESCE(SUM(s.total_score), 0),
+               COALESCE(SUM({x} * s.total_score), 0),
+               COALESCE(SUM({x} * {x}), 0),
+               COALESCE(SUM(s.total_score * s.total_score), 0)
+        FROM sustainability_scores s
+        WHERE s.total_score IS NOT NULL
+    """)
+    conn.commit()
+
+
+# ================= LINEAR (O(1)) =================
+def _fit_line(n, sum_x, sum_y, sum_xy, sum_xx):
+    if n < 2:
+        return None
+    sxx = sum_xx - sum_x * sum_x / n
+    if sxx <= 0:
+        return None
+    slope = (sum_xy - sum_x * sum_y / n) / sxx
+    intercept = (sum_y - slope * sum_x) / n
+    return slope, intercept
+
+
+def linear_forecast(cursor):
+    """
+    Next-month prediction from the running sums. Returns None when there
+    are fewer than two scored months.
+    """
+    cursor.execute(TREND_SUMS_SQL)
+    stats = cursor.fetchone()
+    if stats is None or stats["n"] < 2:
+        return None
+
+    line = _fit_line(stats["n"], stats["sum_x"], stats["sum_y"],
+                     stats["sum_xy"], stats["sum_xx"])
+    if line is None:
+        return None
+
+    cursor.execute(LATEST_SCORE_SQL)
+    last = cursor.fetchone()
+
+    slope, intercept = line
+    next_x = month_index(last["year"], last["month"]) + 1
+    return {
+        "predicted_score": round(slope * next_x + intercept, 2),
+        "last_score": last["total_score"],
+        "slope": slope,
+        "next_label": month_label(next_x)
+    }
+
+
+# ================= RICHER MODELS =================
+def _holt(y):
+    level, trend = y[0], y[1] - y[0]
+    for value in y[1:]:
+        previous = level
+        level = EWMA_ALPHA * value + (1 - EWMA_ALPHA) * (level + trend)
+        trend = EWMA_BETA * (level - previous) + (1 - EWMA_BETA) * trend
+    return level + trend
+
+
+def _score_history(conn):
+    """(x, y) arrays of scored months, from the snapshot when it is current."""
+    import numpy as np
+
+    history = load_scores(conn)
+    if history is not None:
+        keep = ~np.isnan(history["total_score"])
+        x = month_index(history["year"][keep], history["month"][keep]).astype(float)
+        return x, history["total_score"][keep].astype(float)
+
+    rows = conn.execute(SCORE_HISTORY_SQL).fetchall()
+    x = np.array([month_index(r["year"], r["month"]) for r in rows], dtype=float)
+    y = np.array([r["total_score"] for r in rows], dtype=float)
+    return x, y
+
+
+def fit_models(conn):
+    """Fits the whole-series models. Returns None with under two months."""
+    x, y = _score_history(conn)
+    n = len(y)
+    if n < 2:
+        return None
+
+    line = _fit_line(n, x.sum(), y.sum(), (x * y).sum(), (x * x).sum())
+    if line is None:
+        return None
+
+    slope, intercept = line
+    next_x = x[-1] + 1
+    linear = slope * next_x + intercept
+    residuals = y - (slope * x + intercept)
+
+    # Seasonal baseline: mean residual of the same calendar month
+    next_month = int(next_x) % 12
+    same_month = residuals[x.astype(int) % 12 == next_month]
+    seasonal = linear + same_month.mean() if n >= 12 and len(same_month) else None
+
+    band = None
+    if n > 2:
+        s = math.sqrt((residuals ** 2).sum() / (n - 2))
+        sxx = ((x - x.mean()) ** 2).sum()
+        half = BAND_Z * s * math.sqrt(1 + 1 / n + (next_x - x.mean()) ** 2 / sxx)
+        band = [round(float(max(0.0, linear - half)), 2),
+                round(float(min(100.0, linear + half)), 2)]
+
+    return {
+        "next_label": month_label(int(next_x)),
+        "linear": round(float(linear), 2),
+        "seasonal": None if seasonal is None else round(float(seasonal), 2),
+        "ewma": round(float(_holt(y)), 2),
+        "band": band,
+        "months": n
+    }
+
+
+def _fit(campus, generation):
+    try:
+        # load_scores() picks the snapshot by the thread's campus
+        with use_campus(campus):
+            conn = get_connection()
+            try:
+                models = fit_models(conn)
+            finally:
+                conn.close()
+
+        # A write since the fit started makes this result stale; caching it
+        # would also evict the newer generation's payloads
+        if generation == current_generation(campus):
+            set_cached("forecast", generation, models or {}, campus)
+    except Exception:
+        logger.exception("Forecast fit failed")
+    finally:
+        with _fit_lock:
+            _fitting.discard((campus, generation))
+
+
+def cached_models(generation):
+    """
+    Fitted models for this data generation, or None while they are still
+    being fitted in the background.
+    """
+    campus = current_campus()
+    models = get_cached("forecast", generation, campus)
+    if models is not None:
+        return models
+
+    with _fit_lock:
+        if (campus, generation) in _fitting:
+            return None
+        _fitting.add((campus, generation))
+
+    threading.Thread(target=_fit, args=(campus, generation), daemon=True).start()
+    return None
+
+
+if __name__ == "__main__":
+    conn = get_connection()
+    rebuild_trend_stats(conn)
+    n = conn.execute("SELECT n FROM score_trend WHERE id=1").fetchone()[0]
+    conn.close()
+    print(f"✅ Rebuilt score trend ({n} scored months)")
@@ -0,0 +1,494 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from scoring import SCORE_COLUMNS, score, write_scores
+
+CHUNK_SIZE = 5000
+
+REQUIRED_COLUMNS = ["month", "year", "energy", "water", "waste", "greenery"]
+
+METRIC_TABLES = {
+    "energy": "energy_data",
+    "water": "water_data",
+    "waste": "waste_data",
+    "greenery": "greenery_data"
+}
+
+
+class IngestError(ValueError):
+    """Raised when an uploaded sheet fails validation."""
+
+
+# ================= VALIDATION =================
+def _bad_rows(mask, row_offset):
+    # +2 -> 1-based rows plus the header line
+    return (np.flatnonzero(mask)[:5] + 2 + row_offset).tolist()
+
+
+def _month_year(numeric, row_offset):
+    """Checks and casts the month/year columns of a numeric frame."""
+    month = numeric["month"].to_numpy()
+    year = numeric["year"].to_numpy()
+
+    if (month != np.floor(month)).any() or (year != np.floor(year)).any():
+        raise IngestError("Month and year must be whole numbers")
+
+    month = month.astype(np.int64)
+    year = year.astype(np.int64)
+
+    out_of_range = (month < 1) | (month > 12)
+    if out_of_range.any():
+        raise IngestError(
+            f"Month must be between 1 and 12 (rows: {_bad_rows(out_of_range, row_offset)})"
+        )
+
+    return month, year
+
+
+def prepare_frame(df, row_offset=0):
+    """
+    Validates and casts the upload columns as whole arrays.
+    Returns a dict of NumPy arrays keyed by column name.
+    row_offset is the sheet position of the first row, for error messages.
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise IngestError(f"Missing columns: {', '.join(missing)}")
+
+    numeric = df[REQUIRED_COLUMNS].apply(pd.to_numeric, errors="coerce")
+
+    bad = numeric.isna().any(axis=1).to_numpy()
+    if bad.any():
+        raise IngestError(f"Non-numeric or empty values in rows: {_bad_rows(bad, row_offset)}")
+
+    month, year = _month_year(numeric, row_offset)
+
+    columns = {"month": month, "year": year}
+    for metric in METRIC_TABLES:
+        columns[metric] = numeric[metric].to_numpy(dtype=np.float64)
+
+    return columns
+
+
+# ================= GATEWAY READINGS =================
+READING_COLUMNS = ["metric", "value", "month", "year"]
+
+
+def prepare_readings(df, row_offset=0, default_metric=None):
+    """
+    Validates long-format readings (metric, value, month, year) as whole
+    arrays. `metric` is energy/water/waste/greenery (or the table name) and
+    may come from default_metric instead. Returns a dict of arrays.
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    if "metric" not in df.columns and default_metric:
+        df = df.assign(metric=default_metric)
+
+    missing = [c for c in READING_COLUMNS if c not in df.columns]
+    if missing:
+        raise IngestError(f"Missing fields: {', '.join(missing)}")
+
+    metric = (df["metric"].astype(str).str.strip().str.lower()
+              .str.replace(r"_data$", "", regex=True))
+    unknown = (~metric.isin(list(METRIC_TABLES))).to_numpy()
+    if unknown.any():
+        raise IngestError(f"Unknown metric in rows: {_bad_rows(unknown, row_offset)}")
+
+    numeric = df[["value", "month", "year"]].apply(pd.to_numeric, errors="coerce")
+    bad = (numeric.isna().any(axis=1) | ~np.isfinite(numeric["value"])).to_numpy()
+    if bad.any():
+        raise IngestError(f"Non-numeric or empty values in rows: {_bad_rows(bad, row_offset)}")
+
+    month, year = _month_year(numeric, row_offset)
+
+    return {
+        "metric": metric.to_numpy(),
+        "value": numeric["value"].to_numpy(dtype=np.float64),
+        "month": month,
+        "year": year
+    }
+
+
+def write_readings(cursor, readings, user_id):
+    """
+    Inserts validated readings with one executemany per metric table.
+    The caller owns the transaction. Returns the set of (month, year)
+    pairs touched.
+    """
+    for metric, table in METRIC_TABLES.items():
+        mask = readings["metric"] == metric
+        if not mask.any():
+            continue
+        month = readings["month"][mask].tolist()
+        cursor.executemany(
+            f"INSERT INTO {table} (value, month, year, entered_by) VALUES (?, ?, ?, ?)",
+            zip(readings["value"][mask].tolist(), month,
+                readings["year"][mask].tolist(), [user_id] * len(month))
+        )
+
+    return set(zip(readings["month"].tolist(), readings["year"].tolist()))
+
+
+# Request body readers for /api/ingest. Each yields (row_offset, DataFrame);
+# offsets make the row numbers in error messages 1-based reading positions
+# (CSV: file lines).
+def _frame(records):
+    try:
+        return pd.DataFrame.from_records(records)
+    except (TypeError, ValueError):
+        raise IngestError("Each reading must be an object")
+
+
+def json_batches(body, batch_size):
+    records = body.get("readings") if isinstance(body, dict) else body
+    if not isinstance(records, list):
+        raise IngestError("Expected a list of readings")
+
+    for start in range(0, len(records), batch_size):
+        yield start - 1, _frame(records[start:start + batch_size])
+
+
+def ndjson_batches(stream, batch_size):
+    batch = []
+    start = 0
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            batch.append(json.loads(line))
+        except ValueError:
+            raise IngestError(f"Invalid JSON on line {number}")
+
+        if len(batch) == batch_size:
+            yield start - 1, _frame(batch)
+            start += len(batch)
+            batch = []
+
+    if batch:
+        yield start - 1, _frame(batch)
+
+
+def csv_batches(stream, batch_size):
+    try:
+        reader = pd.read_csv(
+            io.TextIOWrapper(stream, encoding="utf-8"),
+            chunksize=batch_size, skip_blank_lines=True
+        )
+    except pd.errors.EmptyDataError:
+        return
+
+    try:
+        for number, chunk in enumerate(reader):
+            yield number * batch_size, chunk
+    except pd.errors.ParserError as e:
+        raise IngestError(str(e))
+
+
+# ================= WRITE =================
+# Uploaded readings are keyed on their month plus upload_row, the row's
+# position among the sheet's rows for that month (0 for the first March
+# 2024 row, 1 for the second, ...). A corrected sheet therefore updates the
+# earlier upload's readings in place instead of adding a second set, and
+# readings it no longer has are removed once it finishes
+# (remove_stale_rows). Manual and gateway readings (upload_row NULL) are
+# never matched. Rows whose value did not change are not rewritten, so
+# their triggers do not fire either.
+UPSERT_UPLOAD_SQL = """
+    INSERT INTO {table} (value, month, year, entered_by, source, upload_row)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(year, month, upload_row) WHERE upload_row IS NOT NULL DO UPDATE SET
+        value = excluded.value,
+        entered_by = excluded.entered_by,
+        source = excluded.source
+    WHERE value != excluded.value
+"""
+
+# Matches readings against a JSON list of [year, month, upload_row]
+UPLOAD_KEYS_JOIN = """
+    json_each(?) AS k
+    JOIN {table} t
+      ON t.year = json_extract(k.value, '$[0]')
+     AND t.month = json_extract(k.value, '$[1]')
+     AND t.upload_row {op} json_extract(k.value, '$[2]')
+"""
+
+
+def upload_rows(month, year, seen):
+    """
+    Each row's upload_row: how many earlier rows of the sheet had the same
+    month. `seen` carries the per-month counts across chunks and is updated.
+    """
+    rows = []
+    for key in zip(year.tolist(), month.tolist()):
+        rows.append(seen.get(key, 0))
+        seen[key] = rows[-1] + 1
+    return rows
+
+
+def write_rows(cursor, columns, scores, user_id, rows, file_hash=None):
+    """
+    Upserts raw readings (keyed by `rows`, see upload_rows) and month
+    scores with executemany. The caller owns the transaction. Returns
+    {"inserted", "updated"} reading counts over the four tables.
+    """
+    month = columns["month"].tolist()
+    year = columns["year"].tolist()
+    users = [user_id] * len(month)
+    sources = [file_hash] * len(month)
+    keys = json.dumps(list(zip(year, month, rows)))
+
+    counts = {"inserted": 0, "updated": 0}
+    for metric, table in METRIC_TABLES.items():
+        cursor.execute(
+            "SELECT COUNT(*) FROM " + UPLOAD_KEYS_JOIN.format(table=table, op="="),
+            (keys,)
+        )
+        existing = cursor.fetchone()[0]
+
+        cursor.executemany(
+            UPSERT_UPLOAD_SQL.format(table=table),
+            zip(columns[metric].tolist(), month, year, users, sources, rows)
+        )
+        # rowcount covers inserts plus updates that changed a value
+        counts["inserted"] += len(month) - existing
+        counts["updated"] += cursor.rowcount - (len(month) - existing)
+
+    # One score per month/year; the last row in the sheet wins
+    frame = pd.DataFrame({"month": month, "year": year})
+    last = ~frame.duplicated(keep="last").to_numpy()
+
+    write_scores(
+        cursor, columns["month"][last], columns["year"][last],
+        {c: scores[c][last] for c in SCORE_COLUMNS}
+    )
+    return counts
+
+
+def remove_stale_rows(cursor, seen):
+    """
+    Deletes uploaded readings of the sheet's months beyond the number of
+    rows the sheet has for them, left over from a longer earlier upload.
+    Returns how many readings were removed.
+    """
+    keys = json.dumps([[year, month, count] for (year, month), count in seen.items()])
+    removed = 0
+    for table in METRIC_TABLES.values():
+        cursor.execute(
+            f"DELETE FROM {table} WHERE id IN (SELECT t.id FROM "
+            + UPLOAD_KEYS_JOIN.format(table=table, op=">=") + ")",
+            (keys,)
+        )
+        removed += cursor.rowcount
+    return removed
+
+
+def ingest_chunk(cursor, df, user_id, row_offset=0, file_hash=None, seen=None):
+    """
+    Validates, scores and writes one batch of rows, upserted on their
+    month and upload_row (see UPSERT_UPLOAD_SQL). `seen` continues the
+    per-month row counts of earlier chunks of the same sheet.
+    Returns (row count, sum of total scores, {"inserted", "updated"}).
+    """
+    columns = prepare_frame(df, row_offset)
+    scores = score(columns)
+    rows = upload_rows(columns["month"], columns["year"], {} if seen is None else seen)
+    counts = write_rows(cursor, columns, scores, user_id, rows, file_hash)
+    return len(rows), float(scores["total_score"].sum()), counts
+
+
+# ================= STREAMING READERS =================
+def iter_xlsx_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Yields DataFrames of at most chunk_size rows from the first sheet,
+    using openpyxl's read-only mode so the workbook is never fully loaded.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        header = [str(h).strip().lower() if h is not None else "" for h in header]
+        batch = []
+
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            batch.append(row[:len(header)])
+            if len(batch) == chunk_size:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        wb.close()
+
+
+def iter_csv_chunks(path, chunk_size=CHUNK_SIZE):
+    yield from pd.read_csv(path, chunksize=chunk_size, skip_blank_lines=True)
+
+
+def iter_chunks(path, filename, chunk_size=CHUNK_SIZE):
+    if filename.lower().endswith(".csv"):
+        return iter_csv_chunks(path, chunk_size)
+    return iter_xlsx_chunks(path, chunk_size)
+
+
+# ================= STREAMING INGESTION =================
+def save_upload(file_storage):
+    """
+    Spools an uploaded file to a temp file while hashing it.
+    Returns (path, sha256 hex digest).
+    """
+    digest = hashlib.sha256()
+    suffix = os.path.splitext(file_storage.filename)[1].lower()
+
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            block = file_storage.stream.read(1024 * 1024)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+
+    return path, digest.hexdigest()
+
+
+UPLOAD_STATUS_SQL = """
+    SELECT chunk_size, chunks_done, rows_done, status FROM upload_progress
+    WHERE file_hash=?
+"""
+
+
+def upload_status(cursor, file_hash):
+    """The upload_progress row of a file's content hash, or None."""
+    cursor.execute(UPLOAD_STATUS_SQL, (file_hash,))
+    return cursor.fetchone()
+
+
+def ingest_file(conn, path, filename, file_hash, user_id,
+                chunk_size=CHUNK_SIZE, on_progress=None):
+    """
+    Streams an uploaded Excel/CSV file in fixed-size chunks. Each chunk is
+    committed together with its progress record in upload_progress, so an
+    interrupted upload of the same file resumes after the last committed
+    chunk, and a file that was already ingested completely is skipped.
+    on_progress(rows) is called after every committed chunk.
+    """
+    started = time.perf_counter()
+    cursor = conn.cursor()
+
+    progress = upload_status(cursor, file_hash)
+    if progress and progress["status"] == "complete":
+        return {
+            "rows": 0,
+            "inserted": 0,
+            "updated": 0,
+            "removed": 0,
+            "duplicate": True,
+            "duplicate_rows": progress["rows_done"],
+            "resumed_chunks": 0,
+            "avg_score": None,
+            "seconds": round(time.perf_counter() - started, 3),
+            "rows_per_second": 0
+        }
+
+    resume_from = 0
+    if progress and progress["status"] == "in_progress":
+        # Chunk boundaries must match the interrupted run
+        resume_from = progress["chunks_done"]
+        chunk_size = progress["chunk_size"]
+
+    cursor.execute("""
+        INSERT INTO upload_progress (file_hash, filename, chunk_size, chunks_done, rows_done, status)
+        VALUES (?, ?, ?, ?, 0, 'in_progress')
+        ON CONFLICT(file_hash) DO UPDATE SET
+            filename=excluded.filename,
+            chunk_size=excluded.chunk_size,
+            chunks_done=excluded.chunks_done,
+            rows_done=CASE WHEN excluded.chunks_done = 0 THEN 0 ELSE rows_done END,
+            status='in_progress',
+            updated_at=CURRENT_TIMESTAMP
+    """, (file_hash, filename, chunk_size, resume_from))
+    conn.commit()
+
+    rows = 0
+    score_sum = 0.0
+    row_offset = 0
+    counts = {"inserted": 0, "updated": 0}
+    seen = {}
+
+    for index, df in enumerate(iter_chunks(path, filename, chunk_size)):
+        chunk_rows = len(df)
+        if index < resume_from:
+            # Committed already; only its per-month row counts are needed
+            columns = prepare_frame(df, row_offset)
+            upload_rows(columns["month"], columns["year"], seen)
+            row_offset += chunk_rows
+            continue
+
+        try:
+            count, chunk_sum, written = ingest_chunk(
+                cursor, df, user_id, row_offset, file_hash, seen
+            )
+            cursor.execute("""
+                UPDATE upload_progress
+                SET chunks_done=?, rows_done=rows_done + ?, updated_at=CURRENT_TIMESTAMP
+                WHERE file_hash=?
+            """, (index + 1, count, file_hash))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        rows += count
+        score_sum += chunk_sum
+        for key in counts:
+            counts[key] += written[key]
+        row_offset += chunk_rows
+
+        if on_progress:
+            on_progress(rows)
+
+    if rows == 0 and resume_from == 0:
+        # Nothing to resume; let a fixed file with the same content retry
+        cursor.execute("DELETE FROM upload_progress WHERE file_hash=?", (file_hash,))
+        conn.commit()
+        raise IngestError("The uploaded sheet has no data rows")
+
+    try:
+        removed = remove_stale_rows(cursor, seen)
+        cursor.execute("""
+            UPDATE upload_progress
+            SET status='complete', updated_at=CURRENT_TIMESTAMP
+            WHERE file_hash=?
+        """, (file_hash,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    elapsed = time.perf_counter() - started
+
+    return {
+        "rows": rows,
+        **counts,
+        "removed": removed,
+        "resumed_chunks": resume_from,
+        "avg_score": round(score_sum / rows, 2) if rows else None,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed) if elapsed > 0 else rows
+    }
@@ -1,15 +1,14 @@
 import sqlite3
-import hashlib
 
-DB_NAME = "sustainability_analytics.db"
+from auth import hash_password
+from database import DB_NAME
+from aggregates import DATA_TABLES, rebuild_monthly_aggregates
+from forecast import MONTH_INDEX_SQL, rebuild_trend_stats
+from timeseries import create_schema
 
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
+def init_db(db_name=DB_NAME):
+    conn = sqlite3.connect(db_name)
     conn.execute("PRAGMA foreign_keys = ON")
     cursor = conn.cursor()
 
@@ -33,6 +32,8 @@ def init_db():
         year INTEGER NOT NULL,
         entered_by INTEGER,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        source TEXT,
+        upload_row INTEGER,
         FOREIGN KEY (entered_by) REFERENCES users(id) ON DELETE SET NULL
     )
     """)
@@ -46,6 +47,8 @@ def init_db():
         year INTEGER NOT NULL,
         entered_by INTEGER,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        source TEXT,
+        upload_row INTEGER,
         FOREIGN KEY (entered_by) REFERENCES users(id) ON DELETE SET NULL
     )
     """)
@@ -59,6 +62,8 @@ def init_db():
         year INTEGER NOT NULL,
         entered_by INTEGER,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        source TEXT,
+        upload_row INTEGER,
         FOREIGN KEY (entered_by) REFERENCES users(id) ON DELETE SET NULL
     )
     """)
@@ -72,6 +77,8 @@ def init_db():
         year INTEGER NOT NULL,
         entered_by INTEGER,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        source TEXT,
+        upload_row INTEGER,
         FOREIGN KEY (entered_by) REFERENCES users(id) ON DELETE SET NULL
     )
     """)
@@ -102,12 +109,318 @@ def init_db():
     )
     """)
 
+    # ---------------- UPLOAD PROGRESS ----------------
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS upload_progress (
+        file_hash TEXT PRIMARY KEY,
+        filename TEXT,
+        chunk_size INTEGER NOT NULL,
+        chunks_done INTEGER NOT NULL DEFAULT 0,
+        rows_done INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL CHECK(status IN ('in_progress', 'complete')),
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # ---------------- MONTHLY AGGREGATES ----------------
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='monthly_aggregates'"
+    )
+    aggregates_exist = cursor.fetchone() is not None
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS monthly_aggregates (
+        table_name TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        value_sum REAL NOT NULL DEFAULT 0,
+        value_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (table_name, year, month)
+    ) WITHOUT ROWID
+    """)
+
+    # Metered time-series readings roll up into monthly_aggregates too
+    create_schema(cursor)
+
+    for table in DATA_TABLES:
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_agg_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO monthly_aggregates (table_name, year, month, value_sum, value_count)
+            VALUES ('{table}', NEW.year, NEW.month, NEW.value, 1)
+            ON CONFLICT(table_name, year, month) DO UPDATE SET
+                value_sum = value_sum + excluded.value_sum,
+                value_count = value_count + 1;
+        END
+        """)
+
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_agg_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            UPDATE monthly_aggregates
+            SET value_sum = value_sum - OLD.value,
+                value_count = value_count - 1
+            WHERE table_name = '{table}' AND year = OLD.year AND month = OLD.month;
+        END
+        """)
+
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_agg_update
+        AFTER UPDATE OF value, month, year ON {table}
+        BEGIN
+            UPDATE monthly_aggregates
+            SET value_sum = value_sum - OLD.value,
+                value_count = value_count - 1
+            WHERE table_name = '{table}' AND year = OLD.year AND month = OLD.month;
+
+            INSERT INTO monthly_aggregates (table_name, year, month, value_sum, value_count)
+            VALUES ('{table}', NEW.year, NEW.month, NEW.value, 1)
+            ON CONFLICT(table_name, year, month) DO UPDATE SET
+                value_sum = value_sum + excluded.value_sum,
+                value_count = value_count + 1;
+        END
+        """)
+
+    # Existing databases: backfill once from the raw readings
+    if not aggregates_exist:
+        rebuild_monthly_aggregates(conn)
+
+    # ---------------- CHANGE COUNTERS ----------------
+    # Bumped on every insert, update and delete, per table and year, so
+    # snapshot.py notices edits that leave the yearly count and sum as
+    # they were (a reading moved to another month, a changed entered_by)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS data_changes (
+        table_name TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        changes INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (table_name, year)
+    ) WITHOUT ROWID
+    """)
+
+    def bump_changes(table, row):
+        return f"""
+            INSERT INTO data_changes (table_name, year, changes)
+            VALUES ('{table}', {row}.year, 1)
+            ON CONFLICT(table_name, year) DO UPDATE SET changes = changes + 1;
+        """
+
+    for table in DATA_TABLES:
+        for event, rows in (("insert", ("NEW",)), ("delete", ("OLD",)),
+                            ("update", ("OLD", "NEW"))):
+            body = "".join(bump_changes(table, row) for row in rows)
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_{event}
+            AFTER {event.upper()} ON {table}
+            BEGIN
+                {body}
+            END
+            """)
+
+    # ---------------- SCORE TREND ----------------
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='score_trend'"
+    )
+    trend_exists = cursor.fetchone() is not None
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS score_trend (
+        id INTEGER PRIMARY KEY CHECK(id = 1),
+        n INTEGER NOT NULL DEFAULT 0,
+        sum_x REAL NOT NULL DEFAULT 0,
+        sum_y REAL NOT NULL DEFAULT 0,
+        sum_xy REAL NOT NULL DEFAULT 0,
+        sum_xx REAL NOT NULL DEFAULT 0,
+        sum_yy REAL NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO score_trend (id) VALUES (1)")
+
+    def trend_update(row, sign):
+        x = MONTH_INDEX_SQL.format(row=row)
+        return f"""
+            UPDATE score_trend SET
+                n = n {sign} 1,
+                sum_x = sum_x {sign} {x},
+                sum_y = sum_y {sign} {row}.total_score,
+                sum_xy = sum_xy {sign} {x} * {row}.total_score,
+                sum_xx = sum_xx {sign} {x} * {x},
+                sum_yy = sum_yy {sign} {row}.total_score * {row}.total_score
+            WHERE id = 1 AND {row}.total_score IS NOT NULL;
+        """
+
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_scores_trend_insert
+    AFTER INSERT ON sustainability_scores
+    BEGIN
+        {trend_update("NEW", "+")}
+    END
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_scores_trend_delete
+    AFTER DELETE ON sustainability_scores
+    BEGIN
+        {trend_update("OLD", "-")}
+    END
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_scores_trend_update
+    AFTER UPDATE OF total_score, month, year ON sustainability_scores
+    BEGIN
+        {trend_update("OLD", "-")}
+        {trend_update("NEW", "+")}
+    END
+    """)
+
+    if not trend_exists:
+        rebuild_trend_stats(conn)
+
+    # ---------------- CACHE GENERATION ----------------
+    # Bumped by scripts that write outside the web app (cache.py)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cache_generation (
+        id INTEGER PRIMARY KEY CHECK(id = 1),
+        generation INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO cache_generation (id) VALUES (1)")
+
+    # ---------------- BACKGROUND JOBS ----------------
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued'
+            CHECK(status IN ('queued', 'running', 'done', 'failed')),
+        payload TEXT NOT NULL,
+        progress INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        output BLOB,
+        error TEXT,
+        user_id INTEGER,
+        worker_pid INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+    )
+    """)
+    # The worker running a job, so jobs orphaned by a crash can be found (jobs.py)
+    columns = [r[1] for r in cursor.execute("PRAGMA table_info(jobs)")]
+    if "worker_pid" not in columns:
+        cursor.execute("ALTER TABLE jobs ADD COLUMN worker_pid INTEGER")
+
+    # ---------------- API INGESTION ----------------
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS api_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        token_hash TEXT NOT NULL UNIQUE,
+        user_id INTEGER NOT NULL,
+        revoked INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """)
+
+    # Responses of /api/ingest requests sent with an Idempotency-Key
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_requests (
+        token_id INTEGER NOT NULL,
+        idempotency_key TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (token_id, idempotency_key)
+    ) WITHOUT ROWID
+    """)
+
     # ---------------- INDEXES ----------------
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scores_year ON sustainability_scores(year)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_energy_year ON energy_data(year)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_water_year ON water_data(year)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_waste_year ON waste_data(year)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_greenery_year ON greenery_data(year)")
+    # Composite (year, month, value) indexes serve the month filters, the
+    # year/month ordering and the value reads without touching the table.
+    # They supersede the old single-column year indexes.
+    for table, prefix in (("energy_data", "energy"), ("water_data", "water"),
+                          ("waste_data", "waste"), ("greenery_data", "greenery")):
+        cursor.execute(f"DROP INDEX IF EXISTS idx_{prefix}_year")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{prefix}_year_month_value "
+            f"ON {table}(year, month, value)"
+        )
+        # Keyset pagination order for view_entries and /api/entries
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{prefix}_year_month_id "
+            f"ON {table}(year, month, id)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{prefix}_entered_by ON {table}(entered_by)"
+        )
+
+        # Earlier keys: per month (collapsed sheet rows), then per file row
+        # (only matched a re-upload of the identical file)
+        cursor.execute(f"DROP INDEX IF EXISTS idx_{prefix}_source_year_month")
+        cursor.execute(f"DROP INDEX IF EXISTS idx_{prefix}_source")
+        columns = [r[1] for r in cursor.execute(f"PRAGMA table_info({table})")]
+        if "source" not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN source TEXT")
+        if "upload_row" not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN upload_row INTEGER")
+            # Earlier uploads' readings ("<sha256>:<sheet row>" sources),
+            # numbered per month in the order they were written
+            cursor.execute(f"""
+                UPDATE {table} SET upload_row = numbered.n, source = substr(source, 1, 64)
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY year, month ORDER BY id) - 1 AS n
+                    FROM {table} WHERE source IS NOT NULL
+                ) AS numbered
+                WHERE {table}.id = numbered.id
+            """)
+        # Uploaded readings are keyed on (year, month, upload_row), the
+        # row's position among its sheet's rows for that month, so a
+        # corrected sheet updates them in place (ingest.py). source is the
+        # content hash of the upload that wrote them. Manual and gateway
+        # readings (upload_row NULL) are not keyed.
+        cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{prefix}_upload "
+            f"ON {table}(year, month, upload_row) WHERE upload_row IS NOT NULL"
+        )
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_user ON activity_logs(user_id)")
+    # Range scan for activity_log.rollover()
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_activity_timestamp ON activity_logs(timestamp)"
+    )
+    # Case-insensitive prefix search on /manage_users
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_username_nocase "
+        "ON users(username COLLATE NOCASE)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ingest_requests_created "
+        "ON ingest_requests(created_at)"
+    )
+    # scoring.score_month() reads one month across all four tables, which
+    # the (table_name, year, month) key cannot seek to
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_monthly_aggregates_year_month "
+        "ON monthly_aggregates(year, month)"
+    )
+
+    # One score row per month; drop older duplicates before enforcing it
+    cursor.execute("""
+        DELETE FROM sustainability_scores
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM sustainability_scores GROUP BY year, month
+        )
+    """)
+    cursor.execute("DROP INDEX IF EXISTS idx_scores_year")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_scores_year_month "
+        "ON sustainability_scores(year, month)"
+    )
 
     # ---------------- DEFAULT ADMIN ----------------
     cursor.execute("SELECT id FROM users WHERE username = ?", ("admin",))
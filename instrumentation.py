@@ -0,0 +1,426 @@
+"""
+Request and SQL instrumentation.
+
+Every request is timed per endpoint, and every statement run through a
+get_connection() connection is counted and timed (execute plus fetch), both
+globally per statement and per request. Results are served as:
+
+    /metrics                 Prometheus text format
+    /admin/slow_queries      slowest statements, slow requests and statements
+                             repeated many times within one request (N+1)
+
+With PROFILE_SLOW_REQUESTS=1 a sampling thread records the call stacks of
+in-flight requests every PROFILE_INTERVAL seconds; requests slower than
+SLOW_REQUEST_MS keep their collapsed stacks for the slow query page.
+
+Set METRICS=0 to turn instrumentation off, and METRICS_TOKEN to require
+"Authorization: Bearer <token>" on /metrics.
+"""
+import hmac
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from functools import lru_cache
+
+from flask import Blueprint, Response, redirect, render_template, request, session, url_for
+
+METRICS_ENABLED = os.environ.get("METRICS", "1") != "0"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+PROFILE_SLOW_REQUESTS = os.environ.get("PROFILE_SLOW_REQUESTS") == "1"
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.01))
+
+# Same statement this many times in one request is reported as a likely N+1
+REPEAT_THRESHOLD = 20
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MAX_STATEMENTS = 500
+LOG_SIZE = 50
+STACK_DEPTH = 40
+
+instrumentation_bp = Blueprint("instrumentation", __name__)
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """One line per statement shape; IN (?, ?, ...) lists of any length match."""
+    sql = " ".join(sql.split())
+    return re.sub(r"\(\?(?:\s*,\s*\?)+\)", "(?, ...)", sql)[:500]
+
+
+def _now():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ================= REGISTRY =================
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = _now()
+            self.requests = Counter()       # (endpoint, method, status) -> count
+            self.durations = {}             # endpoint -> [bucket counts..., sum, count]
+            self.endpoint_sql = {}          # endpoint -> [statements, seconds]
+            self.statements = {}            # sql -> [count, seconds, max seconds]
+            self.slow_queries = deque(maxlen=LOG_SIZE)
+            self.slow_requests = deque(maxlen=LOG_SIZE)
+            self.repeated = deque(maxlen=LOG_SIZE)
+
+    def record_statement(self, sql, seconds, executions=1):
+        state = _current()
+        endpoint = state["endpoint"] if state else "background"
+        key = normalize_sql(sql)
+
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                if len(self.statements) >= MAX_STATEMENTS:
+                    key = "(other statements)"
+                stats = self.statements.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += executions
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+            per_endpoint = self.endpoint_sql.setdefault(endpoint, [0, 0.0])
+            per_endpoint[0] += executions
+            per_endpoint[1] += seconds
+
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                self.slow_queries.append({
+                    "at": _now(),
+                    "endpoint": endpoint,
+                    "ms": round(seconds * 1000, 1),
+                    "sql": key
+                })
+
+        if state:
+            state["statements"][key] += 1
+            state["sql_seconds"] += seconds
+
+    def add_fetch_time(self, sql, seconds):
+        """Rows are stepped lazily, so fetch time belongs to the statement too."""
+        state = _current()
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is not None:
+                stats[1] += seconds
+            endpoint = state["endpoint"] if state else "background"
+            if endpoint in self.endpoint_sql:
+                self.endpoint_sql[endpoint][1] += seconds
+        if state:
+            state["sql_seconds"] += seconds
+
+    def record_request(self, state, status, seconds):
+        endpoint = state["endpoint"]
+        statements = state["statements"]
+
+        with self._lock:
+            self.requests[(endpoint, state["method"], status)] += 1
+
+            hist = self.durations.setdefault(endpoint, [0] * (len(DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+            for sql, count in statements.items():
+                if count >= REPEAT_THRESHOLD:
+                    self.repeated.append({
+                        "at": _now(),
+                        "endpoint": endpoint,
+                        "count": count,
+                        "sql": sql
+                    })
+
+            if seconds * 1000 >= SLOW_REQUEST_MS:
+                samples = state.get("samples") or Counter()
+                self.slow_requests.append({
+                    "at": _now(),
+                    "endpoint": endpoint,
+                    "path": state["path"],
+                    "ms": round(seconds * 1000, 1),
+                    "sql_count": sum(statements.values()),
+                    "sql_ms": round(state["sql_seconds"] * 1000, 1),
+                    "stacks": samples.most_common(20),
+                    "sample_count": sum(samples.values())
+                })
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "requests": dict(self.requests),
+                "durations": {k: list(v) for k, v in self.durations.items()},
+                "endpoint_sql": {k: list(v) for k, v in self.endpoint_sql.items()},
+                "statements": {k: list(v) for k, v in self.statements.items()},
+                "slow_queries": list(self.slow_queries),
+                "slow_requests": list(self.slow_requests),
+                "repeated": list(self.repeated)
+            }
+
+
+metrics = Metrics()
+
+
+# ================= CONNECTIONS =================
+class InstrumentedCursor(sqlite3.Cursor):
+    _sql = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._sql = sql
+            metrics.record_statement(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._sql = sql
+            metrics.record_statement(sql, time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        if self._sql:
+            metrics.add_fetch_time(self._sql, time.perf_counter() - started)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._sql:
+            metrics.add_fetch_time(self._sql, time.perf_counter() - started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        if self._sql:
+            metrics.add_fetch_time(self._sql, time.perf_counter() - started)
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute's) are timed."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """Factory for sqlite3.connect(); plain connections when METRICS=0."""
+    return InstrumentedConnection if METRICS_ENABLED else sqlite3.Connection
+
+
+# ================= SAMPLING PROFILER =================
+_local = threading.local()
+_active = {}  # thread id -> request state
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def _current():
+    return getattr(_local, "state", None)
+
+
+def _stack(frame):
+    parts = []
+    while frame is not None and len(parts) < STACK_DEPTH:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def _sample():
+    while True:
+        time.sleep(PROFILE_INTERVAL)
+        frames = sys._current_frames()
+        for thread_id, state in list(_active.items()):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                state["samples"][_stack(frame)] += 1
+
+
+def _start_sampler():
+    global _sampler
+
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample, name="request-sampler", daemon=True)
+            _sampler.start()
+
+
+# ================= REQUEST HOOKS =================
+def _start_request():
+    state = {
+        "endpoint": request.endpoint or "unmatched",
+        "method": request.method,
+        "path": request.path,
+        "started": time.perf_counter(),
+        "statements": Counter(),
+        "sql_seconds": 0.0,
+        "status": 500
+    }
+    _local.state = state
+
+    if PROFILE_SLOW_REQUESTS:
+        state["samples"] = Counter()
+        _active[threading.get_ident()] = state
+        _start_sampler()
+
+
+def _record_status(response):
+    state = _current()
+    if state:
+        state["status"] = response.status_code
+    return response
+
+
+def _finish_request(exc=None):
+    state = _current()
+    if state is None:
+        return
+
+    _active.pop(threading.get_ident(), None)
+    _local.state = None
+    metrics.record_request(state, state["status"], time.perf_counter() - state["started"])
+
+
+def init_app(app):
+    app.register_blueprint(instrumentation_bp)
+    if METRICS_ENABLED:
+        app.before_request(_start_request)
+        app.after_request(_record_status)
+        app.teardown_request(_finish_request)
+
+
+# ================= PROMETHEUS =================
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def prometheus_text(data):
+    lines = [
+        "# HELP app_requests_total Requests by endpoint, method and status.",
+        "# TYPE app_requests_total counter",
+    ]
+    for (endpoint, method, status), count in sorted(data["requests"].items()):
+        lines.append(f"app_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+    lines += [
+        "# HELP app_request_duration_seconds Request latency by endpoint.",
+        "# TYPE app_request_duration_seconds histogram",
+    ]
+    for endpoint, hist in sorted(data["durations"].items()):
+        for bound, count in zip(DURATION_BUCKETS, hist):
+            lines.append(f"app_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {count}")
+        lines.append(f"app_request_duration_seconds_bucket{_labels(endpoint=endpoint, le='+Inf')} {hist[-1]}")
+        lines.append(f"app_request_duration_seconds_sum{_labels(endpoint=endpoint)} {hist[-2]:.6f}")
+        lines.append(f"app_request_duration_seconds_count{_labels(endpoint=endpoint)} {hist[-1]}")
+
+    lines += [
+        "# HELP app_sql_statements_total SQL statements executed, by endpoint.",
+        "# TYPE app_sql_statements_total counter",
+    ]
+    for endpoint, (count, _) in sorted(data["endpoint_sql"].items()):
+        lines.append(f"app_sql_statements_total{_labels(endpoint=endpoint)} {count}")
+
+    lines += [
+        "# HELP app_sql_seconds_total Time spent in SQL (execute and fetch), by endpoint.",
+        "# TYPE app_sql_seconds_total counter",
+    ]
+    for endpoint, (_, seconds) in sorted(data["endpoint_sql"].items()):
+        lines.append(f"app_sql_seconds_total{_labels(endpoint=endpoint)} {seconds:.6f}")
+
+    lines += [
+        "# HELP app_slow_queries_logged Statements slower than SLOW_QUERY_MS in the recent log.",
+        "# TYPE app_slow_queries_logged gauge",
+        f"app_slow_queries_logged {len(data['slow_queries'])}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+# ================= ROUTES =================
+@instrumentation_bp.route("/metrics")
+def metrics_view():
+    if METRICS_TOKEN:
+        header = request.headers.get("Authorization", "")
+        scheme, _, token = header.partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), METRICS_TOKEN):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+
+    return Response(
+        prometheus_text(metrics.snapshot()),
+        mimetype="text/plain; version=0.0.4"
+    )
+
+
+@instrumentation_bp.route("/admin/slow_queries", methods=["GET", "POST"])
+def slow_queries():
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    if session.get("role") != "admin":
+        return "Access Denied ❌"
+
+    if request.method == "POST":
+        metrics.reset()
+        return redirect(url_for("instrumentation.slow_queries"))
+
+    data = metrics.snapshot()
+
+    statements = sorted(
+        ({"sql": sql, "count": count, "total_ms": round(seconds * 1000, 1),
+          "avg_ms": round(seconds * 1000 / count, 2) if count else 0,
+          "max_ms": round(longest * 1000, 1)}
+         for sql, (count, seconds, longest) in data["statements"].items()),
+        key=lambda s: s["total_ms"], reverse=True
+    )[:50]
+
+    endpoints = sorted(
+        ({"endpoint": endpoint,
+          "requests": hist[-1],
+          "avg_ms": round(hist[-2] * 1000 / hist[-1], 1) if hist[-1] else 0,
+          "sql_per_request": round(data["endpoint_sql"].get(endpoint, [0])[0] / hist[-1], 1)
+          if hist[-1] else 0}
+         for endpoint, hist in data["durations"].items()),
+        key=lambda e: e["avg_ms"], reverse=True
+    )
+
+    return render_template(
+        "slow_queries.html",
+        endpoints=endpoints,
+        statements=statements,
+        slow_queries=reversed(data["slow_queries"]),
+        slow_requests=reversed(data["slow_requests"]),
+        repeated=reversed(data["repeated"]),
+        since=data["started"],
+        slow_query_ms=SLOW_QUERY_MS,
+        slow_request_ms=SLOW_REQUEST_MS,
+        repeat_threshold=REPEAT_THRESHOLD,
+        profiling=PROFILE_SLOW_REQUESTS
+    )
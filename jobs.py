@@ -0,0 +1,290 @@
+"""
+SQLite-backed background job queue.
+
+Heavy work (upload ingestion, PDF rendering) is recorded in the jobs table
+and executed by a local process pool, so request threads return a job id
+immediately. Workers claim a job with a conditional UPDATE, which makes
+re-submitting a queued job harmless. Each campus's jobs live in that
+campus's database, so a job is submitted together with its campus.
+
+A claimed job records its worker's pid. When a pool starts (at first use,
+or after a worker crash broke the previous one) running jobs whose worker
+no longer exists are marked failed; their uploads can simply be re-sent,
+since ingestion resumes after the last committed chunk.
+"""
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Blueprint, jsonify, send_file, session
+
+from cache import bump_generation
+from database import current_campus, get_connection, get_db, list_campuses, use_campus
+from reports import store_report
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/jobs")
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ================= HANDLERS (run in worker processes) =================
+# Handlers import their heavy dependencies (pandas, reportlab) themselves,
+# so only the worker processes load them.
+def _run_upload(conn, job_id, payload):
+    from ingest import ingest_file
+
+    def progress(rows):
+        conn.execute("UPDATE jobs SET progress=? WHERE id=?", (rows, job_id))
+        conn.commit()
+
+    try:
+        return ingest_file(
+            conn, payload["path"], payload["filename"],
+            payload["file_hash"], payload["user_id"],
+            on_progress=progress
+        ), None
+    finally:
+        os.remove(payload["path"])
+
+
+def _run_report(conn, job_id, payload):
+    from reports import render_report
+
+    pdf = render_report(conn, payload.get("year"))
+    return {"bytes": len(pdf)}, pdf
+
+
+HANDLERS = {
+    "upload": _run_upload,
+    "report": _run_report,
+}
+
+
+def run_job(job_id, campus):
+    """Executes one job in a worker process. Returns the job's final status."""
+    with use_campus(campus):
+        return _run_job(job_id)
+
+
+def _run_job(job_id):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE jobs SET status='running', started_at=CURRENT_TIMESTAMP, worker_pid=?
+            WHERE id=? AND status='queued'
+        """, (os.getpid(), job_id))
+        conn.commit()
+
+        if cursor.rowcount == 0:
+            # Already claimed by another worker
+            return None
+
+        cursor.execute("SELECT kind, payload FROM jobs WHERE id=?", (job_id,))
+        job = cursor.fetchone()
+
+        try:
+            result, output = HANDLERS[job["kind"]](
+                conn, job_id, json.loads(job["payload"])
+            )
+        except Exception as e:
+            conn.rollback()
+            conn.execute("""
+                UPDATE jobs SET status='failed', error=?, finished_at=CURRENT_TIMESTAMP
+                WHERE id=?
+            """, (str(e), job_id))
+            conn.commit()
+            return "failed"
+
+        conn.execute("""
+            UPDATE jobs SET status='done', result=?, output=?, finished_at=CURRENT_TIMESTAMP
+            WHERE id=?
+        """, (json.dumps(result), output, job_id))
+        conn.commit()
+        return "done"
+    finally:
+        conn.close()
+
+
+# ================= QUEUE =================
+def _get_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            # spawn: workers must not inherit the web process's threads
+            # or open SQLite handles
+            _pool = ProcessPoolExecutor(
+                max_workers=JOB_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _fail_orphaned()
+            _recover_queued(_pool)
+        return _pool
+
+
+def _submit(pool, job_id, kind, campus):
+    try:
+        future = pool.submit(run_job, job_id, campus)
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool (it re-submits queued jobs)
+        _reset_pool(pool)
+        future = _get_pool().submit(run_job, job_id, campus)
+    if kind == "upload":
+        # The worker's writes are only visible to this process's caches
+        # through a generation bump here
+        future.add_done_callback(lambda f: bump_generation(campus))
+    return future
+
+
+def _reset_pool(broken):
+    global _pool
+
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def _worker_alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+def _fail_orphaned():
+    """
+    Marks running jobs failed on every campus when their worker process is
+    gone. Jobs of other live pools (other web workers) are left alone.
+    """
+    for campus in list_campuses():
+        conn = get_connection(campus)
+        try:
+            rows = conn.execute(
+                "SELECT id, kind, payload, worker_pid FROM jobs WHERE status='running'"
+            ).fetchall()
+
+            for row in rows:
+                if _worker_alive(row["worker_pid"]):
+                    continue
+                conn.execute("""
+                    UPDATE jobs SET status='failed', error=?, finished_at=CURRENT_TIMESTAMP
+                    WHERE id=? AND status='running'
+                """, ("Worker stopped before the job finished", row["id"]))
+                if row["kind"] == "upload":
+                    # _run_upload never reached its cleanup
+                    try:
+                        os.remove(json.loads(row["payload"])["path"])
+                    except FileNotFoundError:
+                        pass
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _recover_queued(pool):
+    """Re-submits jobs left queued by a previous process, on every campus."""
+    for campus in list_campuses():
+        conn = get_connection(campus)
+        rows = conn.execute("SELECT id, kind FROM jobs WHERE status='queued'").fetchall()
+        conn.close()
+
+        for row in rows:
+            _submit(pool, row["id"], row["kind"], campus)
+
+
+def enqueue(kind, payload, user_id):
+    if kind not in HANDLERS:
+        raise ValueError("Unknown job kind")
+
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO jobs (kind, payload, user_id) VALUES (?, ?, ?)",
+        (kind, json.dumps(payload), user_id)
+    )
+    conn.commit()
+
+    job_id = cursor.lastrowid
+    _submit(_get_pool(), job_id, kind, current_campus())
+    return job_id
+
+
+def get_job(job_id):
+    cursor = get_db().cursor()
+    cursor.execute("""
+        SELECT id, kind, status, progress, result, error, user_id,
+               created_at, started_at, finished_at
+        FROM jobs WHERE id=?
+    """, (job_id,))
+    return cursor.fetchone()
+
+
+def _visible(job):
+    return job and (job["user_id"] == session.get("user_id") or session.get("role") == "admin")
+
+
+# ================= ROUTES =================
+@jobs_bp.route("/<int:job_id>")
+def job_status(job_id):
+    if "user_id" not in session:
+        return jsonify(error="Login required"), 401
+
+    job = get_job(job_id)
+    if not _visible(job):
+        return jsonify(error="Job not found"), 404
+
+    return jsonify(
+        id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        progress=job["progress"],
+        result=json.loads(job["result"]) if job["result"] else None,
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"]
+    )
+
+
+@jobs_bp.route("/<int:job_id>/download")
+def job_download(job_id):
+    if "user_id" not in session:
+        return jsonify(error="Login required"), 401
+
+    job = get_job(job_id)
+    if not _visible(job) or job["kind"] != "report":
+        return jsonify(error="Job not found"), 404
+
+    if job["status"] != "done":
+        return jsonify(error="Report is not ready", status=job["status"]), 409
+
+    cursor = get_db().cursor()
+    cursor.execute("SELECT payload, output FROM jobs WHERE id=?", (job_id,))
+    row = cursor.fetchone()
+    payload = json.loads(row["payload"])
+    year = payload.get("year")
+
+    # Later downloads of the same data generation skip the queue
+    store_report(payload["generation"], year, row["output"])
+
+    return send_file(
+        io.BytesIO(row["output"]),
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=f"sustainability_report_{year or 'all'}.pdf"
+    )
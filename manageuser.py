@@ -1,10 +1,83 @@
 from flask import Blueprint, render_template, redirect, url_for, session, request
-from database import get_connection
-import hashlib
+from database import get_db
+from auth import hash_password
 
 manageuser_bp = Blueprint("manageuser", __name__)
 
 # ---------------- MANAGE USERS ----------------
+USERS_PER_PAGE = 50
+
+# Highest code point: prefix || this sorts after every name with the prefix
+PREFIX_END = chr(0x10FFFF)
+
+
+def users_page_query(search="", after_id=0, limit=USERS_PER_PAGE):
+    """
+    One page of users with their contribution counts. The page is picked
+    first (prefix search and keyset on the NOCASE username index), then
+    a single UNION ALL aggregation counts rows for just those users via the
+    entered_by / user_id indexes and is joined back once.
+    """
+    where = "WHERE 1=1"
+    params = []
+
+    if after_id:
+        # Keyset on the index order; the cursor is the last user's id.
+        # The plain >= bound is what lets SQLite seek the index.
+        where += """
+            AND username COLLATE NOCASE >= (SELECT username FROM users WHERE id=?)
+            AND (username COLLATE NOCASE, id) > ((SELECT username FROM users WHERE id=?), ?)
+        """
+        params += [after_id, after_id, after_id]
+
+    if search:
+        where += " AND username COLLATE NOCASE >= ? AND username COLLATE NOCASE < ?"
+        params += [search, search + PREFIX_END]
+
+    query = f"""
+        WITH page AS (
+            SELECT id, username, role
+            FROM users
+            {where}
+            ORDER BY username COLLATE NOCASE, id
+            LIMIT ?
+        ),
+        contributions AS (
+            SELECT entered_by AS user_id, COUNT(*) AS energy_count, 0 AS water_count,
+                   0 AS waste_count, 0 AS greenery_count, 0 AS activity_count
+            FROM energy_data WHERE entered_by IN (SELECT id FROM page) GROUP BY entered_by
+            UNION ALL
+            SELECT entered_by, 0, COUNT(*), 0, 0, 0
+            FROM water_data WHERE entered_by IN (SELECT id FROM page) GROUP BY entered_by
+            UNION ALL
+            SELECT entered_by, 0, 0, COUNT(*), 0, 0
+            FROM waste_data WHERE entered_by IN (SELECT id FROM page) GROUP BY entered_by
+            UNION ALL
+            SELECT entered_by, 0, 0, 0, COUNT(*), 0
+            FROM greenery_data WHERE entered_by IN (SELECT id FROM page) GROUP BY entered_by
+            UNION ALL
+            SELECT user_id, 0, 0, 0, 0, COUNT(*)
+            FROM activity_logs WHERE user_id IN (SELECT id FROM page) GROUP BY user_id
+        )
+        SELECT
+            page.id,
+            page.username,
+            page.role,
+            COALESCE(SUM(c.energy_count), 0) AS energy_count,
+            COALESCE(SUM(c.water_count), 0) AS water_count,
+            COALESCE(SUM(c.waste_count), 0) AS waste_count,
+            COALESCE(SUM(c.greenery_count), 0) AS greenery_count,
+            COALESCE(SUM(c.activity_count), 0) AS activity_count
+        FROM page
+        LEFT JOIN contributions c ON c.user_id = page.id
+        GROUP BY page.id
+        ORDER BY page.username COLLATE NOCASE, page.id
+    """
+    params.append(limit)
+
+    return query, params
+
+
 @manageuser_bp.route("/manage_users")
 def manage_users():
     if "user_id" not in session:
@@ -14,35 +87,27 @@ def manage_users():
         return "Access Denied ❌"
 
     search = request.args.get("search", "").strip()
+    after_id = request.args.get("after", 0, type=int)
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    query = """
-        SELECT 
-            u.id,
-            u.username,
-            u.role,
-
-            (SELECT COUNT(*) FROM energy_data WHERE entered_by = u.id) AS energy_count,
-            (SELECT COUNT(*) FROM water_data WHERE entered_by = u.id) AS water_count,
-            (SELECT COUNT(*) FROM waste_data WHERE entered_by = u.id) AS waste_count,
-            (SELECT COUNT(*) FROM greenery_data WHERE entered_by = u.id) AS greenery_count,
-            (SELECT COUNT(*) FROM activity_logs WHERE user_id = u.id) AS activity_count
-
-        FROM users u
-    """
-
-    if search:
-        query += " WHERE u.username LIKE ?"
-        cursor.execute(query, (f"%{search}%",))
-    else:
-        cursor.execute(query)
+    cursor = get_db().cursor()
 
+    # One extra row tells us whether there is a next page
+    query, params = users_page_query(search, after_id, USERS_PER_PAGE + 1)
+    cursor.execute(query, params)
     users = cursor.fetchall()
-    conn.close()
 
-    return render_template("manage_users.html", users=users, search=search)
+    next_after = None
+    if len(users) > USERS_PER_PAGE:
+        users = users[:USERS_PER_PAGE]
+        next_after = users[-1]["id"]
+
+    return render_template(
+        "manage_users.html",
+        users=users,
+        search=search,
+        is_first_page=after_id == 0,
+        next_after=next_after
+    )
 
 
 # ---------------- DELETE USER ----------------
@@ -54,11 +119,10 @@ def delete_user(user_id):
     if user_id == session.get("user_id"):
         return "You cannot delete yourself ❌"
 
-    conn = get_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM users WHERE id=?", (user_id,))
     conn.commit()
-    conn.close()
 
     return redirect(url_for("manageuser.manage_users"))
 
@@ -70,15 +134,14 @@ def reset_password(user_id):
         return "Access Denied ❌"
 
     new_password = "password123"
-    hashed = hashlib.sha256(new_password.encode()).hexdigest()
+    hashed = hash_password(new_password)
 
-    conn = get_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute(
         "UPDATE users SET password_hash=? WHERE id=?",
         (hashed, user_id)
     )
     conn.commit()
-    conn.close()
 
     return redirect(url_for("manageuser.manage_users"))
@@ -0,0 +1,128 @@
+"""
+Query-plan regression check for the hot queries.
+
+Builds a fresh database with init_db(), runs EXPLAIN QUERY PLAN on every
+query below and exits non-zero if any of them falls back to a full table
+scan or a temp B-tree sort:
+
+    python query_plans.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+from init_db import init_db
+from activity_log import ROLLOVER_DELETE_SQL
+from aggregates import DATA_TABLES, OVERALL_AVERAGE_SQL
+from auth import USER_BY_NAME_SQL
+from charts import BUILDING_SERIES_SQL, COMPONENT_SERIES_SQL, SCORE_SERIES_SQL
+from dataentry import ENTRY_MONTH_SQL, entries_query
+from forecast import LATEST_SCORE_SQL, SCORE_HISTORY_SQL, TREND_AVERAGE_SQL, TREND_SUMS_SQL
+from ingest import UPLOAD_KEYS_JOIN, UPLOAD_STATUS_SQL
+from manageuser import users_page_query
+from scoring import MONTH_WHERE, monthly_metrics_sql
+
+# Steps that only touch the materialized, LIMIT-bounded page of users
+PAGE_STEPS = ("SCAN page", "USE TEMP B-TREE FOR GROUP BY", "USE TEMP B-TREE FOR ORDER BY")
+
+# Merges one building's meter-months, found through its meters' keys
+BUILDING_STEPS = ("USE TEMP B-TREE FOR GROUP BY",)
+
+
+def hot_queries():
+    """
+    (name, sql, params[, allowed plan steps]) for every statement checked.
+    The SQL is imported from the modules that run it, so it cannot drift.
+    """
+    queries = []
+
+    for table in DATA_TABLES:
+        queries += [
+            (f"view_entries {table} (month+year)",
+             *entries_query(table, 1, 2025)),
+            (f"view_entries {table} (year)",
+             *entries_query(table, None, 2025)),
+            (f"view_entries {table} (deep page)",
+             *entries_query(table, None, None, (2025, 1, 1000))),
+            (f"delete_entry {table}",
+             ENTRY_MONTH_SQL.format(table=table), (1,)),
+            (f"dashboard average {table}", OVERALL_AVERAGE_SQL, (table,)),
+            (f"upload existing keys {table}",
+             "SELECT COUNT(*) FROM " + UPLOAD_KEYS_JOIN.format(table=table, op="="),
+             ("[[2025, 1, 0]]",)),
+        ]
+
+    queries += [
+        ("score month", monthly_metrics_sql(MONTH_WHERE), (2025, 1)),
+        ("rescore all months", monthly_metrics_sql(), ()),
+        ("dashboard trend", TREND_AVERAGE_SQL, ()),
+        ("linear forecast", TREND_SUMS_SQL, ()),
+        ("latest score", LATEST_SCORE_SQL, ()),
+        ("score history", SCORE_HISTORY_SQL, ()),
+        ("score chart series", SCORE_SERIES_SQL, ()),
+        ("component chart series", COMPONENT_SERIES_SQL, ("energy_data",)),
+        ("building chart series", BUILDING_SERIES_SQL, ("Main Block", "energy"),
+         BUILDING_STEPS),
+        ("activity rollover", ROLLOVER_DELETE_SQL, ("2025-01-01 00:00:00", "2024")),
+        ("upload dedup", UPLOAD_STATUS_SQL, ("0" * 64,)),
+        ("login", USER_BY_NAME_SQL, ("admin",)),
+        ("manage_users page", *users_page_query(), PAGE_STEPS),
+        ("manage_users next page", *users_page_query("", 5), PAGE_STEPS),
+        ("manage_users search", *users_page_query("adm"), PAGE_STEPS),
+    ]
+
+    return queries
+
+
+def plan_problems(detail):
+    """Returns why a plan step is a regression, or None if it is fine."""
+    if detail.startswith("SCAN ") and " INDEX " not in f"{detail} ":
+        return "full table scan"
+    if "USE TEMP B-TREE" in detail:
+        return "temp B-tree sort"
+    return None
+
+
+def check_plans(conn):
+    failures = []
+
+    for name, sql, params, *bounded in hot_queries():
+        allowed = bounded[0] if bounded else ()
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", tuple(params)):
+            detail = row[3]
+            if detail in allowed:
+                continue
+            problem = plan_problems(detail)
+            if problem:
+                failures.append((name, problem, detail))
+
+    return failures
+
+
+def main():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+
+    try:
+        with redirect_stdout(open(os.devnull, "w")):
+            init_db(path)
+
+        conn = sqlite3.connect(path)
+        failures = check_plans(conn)
+        conn.close()
+    finally:
+        os.remove(path)
+
+    if failures:
+        for name, problem, detail in failures:
+            print(f"❌ {name}: {problem} ({detail})")
+        return 1
+
+    print(f"✅ {len(hot_queries())} hot queries use indexes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Debounced month score recalculation.
+
+Write paths call mark_dirty(month, year) instead of rescoring straight
+away. At the end of the request the dirty months are handed to a
+background scheduler, which waits until RECALC_WINDOW seconds pass without
+new marks (or RECALC_MAX_DELAY in total) and then rescores every dirty
+month once, in one transaction. A burst of 200 deletes in the same month
+costs one recalculation. Dirty months are tracked per campus and each
+campus is rescored in its own database.
+
+Set RECALC_WINDOW=0 to rescore synchronously at the end of each request.
+If a campus fails to rescore, its months stay dirty and are retried after
+RECALC_MAX_DELAY.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from flask import g
+
+from cache import bump_generation
+from database import current_campus, get_connection, get_db, use_campus
+
+RECALC_WINDOW = float(os.environ.get("RECALC_WINDOW", 1.0))
+RECALC_MAX_DELAY = 5 * RECALC_WINDOW
+
+logger = logging.getLogger(__name__)
+
+
+def rescore_months(conn, months):
+    """Rescores each (month, year) once and commits."""
+    from scoring import score_month
+
+    cursor = conn.cursor()
+    try:
+        for month, year in sorted(months, key=lambda m: (m[1], m[0])):
+            score_month(cursor, month, year)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# ================= SCHEDULER =================
+class RecalcScheduler:
+    def __init__(self, window=RECALC_WINDOW, max_delay=RECALC_MAX_DELAY):
+        self.window = window
+        self.max_delay = max_delay
+        self._dirty = set()  # (campus, month, year)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def schedule(self, months):
+        with self._lock:
+            self._dirty.update(months)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="recalc-scheduler", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+
+        self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return 0
+
+        by_campus = {}
+        for campus, month, year in dirty:
+            by_campus.setdefault(campus, set()).add((month, year))
+
+        failed = None
+        for campus, months in by_campus.items():
+            try:
+                # score_month() reads the campus's scoring profile
+                with use_campus(campus):
+                    conn = get_connection()
+                    try:
+                        rescore_months(conn, months)
+                    finally:
+                        conn.close()
+            except Exception as e:
+                # Rolled back; keep the months dirty for the next flush
+                with self._lock:
+                    self._dirty.update((campus, month, year) for month, year in months)
+                failed = failed or e
+                continue
+            bump_generation(campus)
+
+        if failed:
+            raise failed
+        return len(dirty)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+
+            # Debounce: keep waiting while marks keep arriving
+            deadline = time.monotonic() + self.max_delay
+            while True:
+                self._wake.clear()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._wake.wait(min(self.window, remaining)):
+                    break
+
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Score recalculation failed")
+                # Retry the months put back by flush() later
+                time.sleep(self.max_delay)
+                self._wake.set()
+
+
+scheduler = RecalcScheduler()
+
+
+# ================= REQUEST HOOKS =================
+def mark_dirty(month, year):
+    """Queues (month, year) for recalculation after this request."""
+    if "dirty_months" not in g:
+        g.dirty_months = set()
+    g.dirty_months.add((int(month), int(year)))
+
+
+def _flush_request(response):
+    months = g.pop("dirty_months", None)
+    if not months:
+        return response
+
+    if RECALC_WINDOW <= 0:
+        rescore_months(get_db(), months)
+        bump_generation()
+    else:
+        campus = current_campus()
+        scheduler.schedule((campus, month, year) for month, year in months)
+    return response
+
+
+def init_app(app):
+    app.after_request(_flush_request)
@@ -0,0 +1,219 @@
+import io
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from database import current_campus
+
+# reportlab is imported inside the layout functions: it is only needed by
+# the job worker that renders a report, not by every web worker.
+
+# Rows per Table flowable; keeps each table small enough to split cleanly
+TABLE_BATCH = 40
+
+# Rendered PDFs keyed by (campus, data generation, year)
+REPORT_CACHE_SIZE = 16
+
+_cache_lock = threading.Lock()
+_report_cache = OrderedDict()
+
+SCORE_HEADER = ["Month", "Year", "Energy", "Water", "Waste", "Greenery", "Total"]
+READING_HEADER = ["Month", "Year", "Energy (kWh)", "Water (L)", "Waste (kg)", "Greenery (sq.m)"]
+
+COMPONENT_TABLES = ("energy_data", "water_data", "waste_data", "greenery_data")
+
+
+# ================= QUERIES =================
+def _year_filter(year, column="year"):
+    if year is None:
+        return "", ()
+    return f" WHERE {column}=?", (year,)
+
+
+def iter_scores(cursor, year=None):
+    where, params = _year_filter(year)
+    cursor.execute(f"""
+        SELECT month, year, energy_score, water_score,
+               waste_score, greenery_score, total_score
+        FROM sustainability_scores{where}
+        ORDER BY year, month
+    """, params)
+    return cursor
+
+
+def iter_component_averages(cursor, year=None):
+    """Monthly average reading per component, from monthly_aggregates."""
+    where, params = _year_filter(year)
+    where = f"{where} AND value_count > 0" if where else " WHERE value_count > 0"
+    columns = ",\n".join(
+        f"MAX(CASE WHEN table_name='{t}' THEN value_sum / value_count END) AS {t}"
+        for t in COMPONENT_TABLES
+    )
+    cursor.execute(f"""
+        SELECT month, year,
+        {columns}
+        FROM monthly_aggregates{where}
+        GROUP BY year, month
+        ORDER BY year, month
+    """, params)
+    return cursor
+
+
+# ================= LAYOUT =================
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def _batched_tables(rows, header, to_cells):
+    """
+    Turns a row iterator into a series of Table flowables of TABLE_BATCH
+    rows each, so the cursor is consumed incrementally.
+    """
+    batch = []
+    for row in rows:
+        batch.append(to_cells(row))
+        if len(batch) == TABLE_BATCH:
+            yield _table(header, batch)
+            batch = []
+    if batch:
+        yield _table(header, batch)
+
+
+@lru_cache(maxsize=None)
+def _table_style():
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    return TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#2c7be5")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("ALIGN", (2, 0), (-1, -1), "RIGHT"),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f1f5ff")]),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#cbd5e1")),
+    ])
+
+
+def _table(header, rows):
+    from reportlab.platypus import Table
+
+    table = Table([header] + rows, repeatRows=1, hAlign="LEFT")
+    table.setStyle(_table_style())
+    return table
+
+
+def _trend_chart(points):
+    from reportlab.graphics.charts.lineplots import LinePlot
+    from reportlab.graphics.shapes import Drawing, String
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+
+    drawing = Drawing(17 * cm, 7 * cm)
+
+    if len(points) < 2:
+        drawing.add(String(10, 90, "Not enough data for a trend chart", fontSize=9))
+        return drawing
+
+    chart = LinePlot()
+    chart.x = 40
+    chart.y = 30
+    chart.width = 17 * cm - 60
+    chart.height = 7 * cm - 50
+    chart.data = [points]
+    chart.lines[0].strokeColor = colors.HexColor("#2c7be5")
+    chart.lines[0].strokeWidth = 1.5
+    chart.yValueAxis.valueMin = 0
+    chart.yValueAxis.valueMax = 100
+    chart.xValueAxis.labelTextFormat = "%d"
+    chart.xValueAxis.valueStep = max(1, int((points[-1][0] - points[0][0]) / 8) or 1)
+    drawing.add(chart)
+    return drawing
+
+
+def render_report(conn, year=None):
+    """Renders the sustainability report as PDF bytes in memory."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    buffer = io.BytesIO()
+    styles = getSampleStyleSheet()
+
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4,
+        title="Sustainability Report",
+        leftMargin=2 * cm, rightMargin=2 * cm,
+        topMargin=2 * cm, bottomMargin=2 * cm
+    )
+
+    story = [
+        Paragraph("Sustainability Report", styles["Title"]),
+        Paragraph(f"Year: {year}" if year else "All years", styles["Heading3"]),
+        Spacer(1, 0.4 * cm),
+    ]
+
+    cursor = conn.cursor()
+
+    # The chart needs the whole series; only (x, score) pairs are kept
+    points = []
+    total_sum = 0.0
+    for r in iter_scores(cursor, year):
+        if r["total_score"] is None:
+            continue
+        points.append((r["year"] + (r["month"] - 1) / 12, r["total_score"]))
+        total_sum += r["total_score"]
+
+    if points:
+        story.append(Paragraph(
+            f"Months scored: {len(points)} &nbsp;&nbsp; "
+            f"Average score: {total_sum / len(points):.2f}",
+            styles["Normal"]
+        ))
+    else:
+        story.append(Paragraph("No scores recorded for this period.", styles["Normal"]))
+
+    story += [
+        Spacer(1, 0.4 * cm),
+        Paragraph("Score Trend", styles["Heading2"]),
+        _trend_chart(points),
+        Paragraph("Monthly Component Scores", styles["Heading2"]),
+    ]
+
+    story.extend(_batched_tables(
+        iter_scores(cursor, year), SCORE_HEADER,
+        lambda r: [r["month"], r["year"], _fmt(r["energy_score"]), _fmt(r["water_score"]),
+                   _fmt(r["waste_score"]), _fmt(r["greenery_score"]), _fmt(r["total_score"])]
+    ))
+
+    story += [
+        Spacer(1, 0.4 * cm),
+        Paragraph("Average Monthly Readings", styles["Heading2"]),
+    ]
+
+    story.extend(_batched_tables(
+        iter_component_averages(cursor, year), READING_HEADER,
+        lambda r: [r["month"], r["year"]] + [_fmt(r[t]) for t in COMPONENT_TABLES]
+    ))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+# ================= CACHE =================
+def cached_report(generation, year=None):
+    key = (current_campus(), generation, year)
+
+    with _cache_lock:
+        pdf = _report_cache.get(key)
+        if pdf is not None:
+            _report_cache.move_to_end(key)
+        return pdf
+
+
+def store_report(generation, year, pdf):
+    with _cache_lock:
+        _report_cache[(current_campus(), generation, year)] = pdf
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
@@ -0,0 +1,202 @@
+"""
+Bulk rescore of sustainability_scores.
+
+Splits a year/month range across a process pool; each worker reads its
+partition from monthly_aggregates with one grouped query and scores it with
+scoring.score(). All results are written in a single transaction, or only
+compared against the stored scores with --dry-run. --campus picks both the
+campus database and its scoring profile:
+
+    python rescore.py --start 2015-01 --end 2020-12 --workers 4 --dry-run
+    python rescore.py --campus north
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import database
+from cache import bump_stored_generation
+from scoring import SCORE_COLUMNS, get_profile, monthly_metrics, score, write_scores
+
+# Totals closer than this are reported as unchanged
+DIFF_TOLERANCE = 0.005
+
+# A spawned worker takes ~380 ms to start (~300 ms of it imports) while
+# scoring costs ~13 us per month, so a partition only pays for its own
+# process from about 30,000 months; anything shorter is scored inline.
+# Lower it where workers start faster.
+MIN_PARTITION_MONTHS = int(os.environ.get("RESCORE_MIN_PARTITION_MONTHS", 30000))
+
+# Month-index range filter shared by the reads below
+RANGE_WHERE = "WHERE (year * 12 + month - 1) BETWEEN ? AND ?"
+
+
+def parse_month(value):
+    """'2021-03' -> month index (year * 12 + month - 1)."""
+    try:
+        year, month = (int(p) for p in value.split("-"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected YYYY-MM, got {value!r}")
+    if not 1 <= month <= 12:
+        raise argparse.ArgumentTypeError(f"Month out of range in {value!r}")
+    return year * 12 + month - 1
+
+
+def format_month(index):
+    year, month = divmod(index, 12)
+    return f"{year}-{month + 1:02d}"
+
+
+def partitions(start, end, count):
+    """
+    Splits [start, end] into at most `count` contiguous month ranges of at
+    least MIN_PARTITION_MONTHS each.
+    """
+    span = end - start + 1
+    count = max(1, min(count, span // MIN_PARTITION_MONTHS))
+    bounds = np.linspace(start, end + 1, count + 1).astype(int)
+    return [(int(a), int(b) - 1) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+# ================= WORKER =================
+def score_partition(db_path, start, end, campus):
+    """Runs in a worker process. Returns (metrics, scores) as plain lists."""
+    # Open the campus's file directly; the worker's CAMPUS may differ
+    conn = database.connect(db_path)
+    try:
+        metrics = monthly_metrics(conn.cursor(), RANGE_WHERE, (start, end))
+    finally:
+        conn.close()
+
+    scores = score(metrics, get_profile(campus))
+    return (
+        {"month": metrics["month"].tolist(), "year": metrics["year"].tolist()},
+        {c: scores[c].tolist() for c in SCORE_COLUMNS}
+    )
+
+
+def _score_all(ranges, campus, workers):
+    if workers <= 1 or len(ranges) == 1:
+        # Not worth a pool
+        return [score_partition(database.campus_path(campus), a, b, campus) for a, b in ranges]
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        futures = [
+            pool.submit(score_partition, database.campus_path(campus), a, b, campus)
+            for a, b in ranges
+        ]
+        return [f.result() for f in futures]
+
+
+# ================= RESCORE =================
+def stored_totals(cursor, start, end):
+    cursor.execute(f"""
+        SELECT year, month, total_score FROM sustainability_scores
+        {RANGE_WHERE}
+    """, (start, end))
+    return {(r["year"], r["month"]): r["total_score"] for r in cursor.fetchall()}
+
+
+def rescore_range(conn, start=None, end=None, workers=1, campus=None, dry_run=False):
+    """
+    Rescores every month in [start, end] (month indexes; defaults to the
+    whole history) of `campus`, which `conn` must belong to. Returns a
+    report dict with throughput and, for dry runs, the list of changed
+    months.
+    """
+    started = time.perf_counter()
+    campus = campus or database.current_campus()
+    cursor = conn.cursor()
+
+    if start is None or end is None:
+        cursor.execute("SELECT MIN(year * 12 + month - 1), MAX(year * 12 + month - 1) "
+                       "FROM monthly_aggregates")
+        first, last = cursor.fetchone()
+        if first is None:
+            return {"months": 0, "seconds": 0.0, "months_per_second": 0, "changes": []}
+        start = first if start is None else start
+        end = last if end is None else end
+
+    ranges = partitions(start, end, max(1, workers))
+    results = _score_all(ranges, campus, workers)
+
+    month = [m for metrics, _ in results for m in metrics["month"]]
+    year = [y for metrics, _ in results for y in metrics["year"]]
+    scores = {c: [v for _, s in results for v in s[c]] for c in SCORE_COLUMNS}
+
+    changes = []
+    if dry_run:
+        old = stored_totals(cursor, start, end)
+        for y, m, new in zip(year, month, scores["total_score"]):
+            before = old.get((y, m))
+            if before is None or abs(before - new) > DIFF_TOLERANCE:
+                changes.append({"year": y, "month": m, "old": before, "new": new})
+    else:
+        try:
+            write_scores(cursor, month, year, scores)
+            # Running web workers pick this up on their next request
+            bump_stored_generation(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    seconds = time.perf_counter() - started
+    return {
+        "months": len(month),
+        "partitions": len(ranges),
+        "seconds": round(seconds, 3),
+        "months_per_second": round(len(month) / seconds) if seconds else 0,
+        "changes": changes
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--start", type=parse_month, help="first month, YYYY-MM")
+    parser.add_argument("--end", type=parse_month, help="last month, YYYY-MM")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--campus", help="campus database and scoring profile (default: CAMPUS)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="show changed totals without writing")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.start is not None and args.end is not None and args.start > args.end:
+        parser.error("--start is after --end")
+
+    campus = args.campus or database.current_campus()
+    conn = database.get_connection(campus)
+    try:
+        report = rescore_range(
+            conn, args.start, args.end, args.workers, campus, args.dry_run
+        )
+    finally:
+        conn.close()
+
+    if args.dry_run:
+        for change in report["changes"]:
+            label = format_month(change["year"] * 12 + change["month"] - 1)
+            old = "new" if change["old"] is None else f"{change['old']:.2f}"
+            print(f"{label}  {old} -> {change['new']:.2f}")
+        print(f"{len(report['changes'])} of {report['months']} months would change")
+
+    print(f"✅ Scored {report['months']} months in {report['seconds']}s "
+          f"({report['months_per_second']} months/s, {report['partitions']} partitions)"
+          if report["months"] else "No aggregated months in range")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
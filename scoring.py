@@ -0,0 +1,192 @@
+"""
+Sustainability scoring engine.
+
+score() turns whole arrays (or a DataFrame) of monthly metrics into every
+component score and the total in one vectorized call. It is shared by the
+upload path, recalculate_month_score and the bulk rescore below, so a
+formula change only happens here.
+
+Each component is normalised to 0-100 either as "lower is better"
+(100 - value / scale) or "higher is better" (value / scale), and the total
+is the weighted mean of the components. Profiles can be overridden per
+campus with a JSON file named by SCORING_CONFIG, e.g.
+
+    {"north": {"energy": {"scale": 12}, "greenery": {"weight": 2}}}
+"""
+import copy
+import json
+import os
+import sys
+
+import numpy as np
+
+from database import current_campus
+
+METRICS = ("energy", "water", "waste", "greenery")
+
+DEFAULT_PROFILE = {
+    "energy": {"direction": "lower", "scale": 10, "weight": 1},
+    "water": {"direction": "lower", "scale": 10, "weight": 1},
+    "waste": {"direction": "lower", "scale": 5, "weight": 1},
+    "greenery": {"direction": "higher", "scale": 2, "weight": 1},
+}
+
+SCORE_COLUMNS = [f"{m}_score" for m in METRICS] + ["total_score"]
+
+_profiles = None
+
+
+# ================= PROFILES =================
+def _load_profiles():
+    profiles = {"default": DEFAULT_PROFILE}
+
+    path = os.environ.get("SCORING_CONFIG")
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+
+        for campus, components in overrides.items():
+            profile = copy.deepcopy(DEFAULT_PROFILE)
+            for metric, settings in components.items():
+                if metric not in profile:
+                    raise ValueError(f"Unknown scoring metric: {metric}")
+                profile[metric].update(settings)
+            profiles[campus] = profile
+
+    return profiles
+
+
+def get_profile(campus=None):
+    """The scoring profile of `campus`, by default the current campus."""
+    global _profiles
+
+    campus = campus or current_campus()
+    if _profiles is None:
+        _profiles = _load_profiles()
+    return _profiles.get(campus, _profiles["default"])
+
+
+# ================= SCORING =================
+def score(metrics, profile=None):
+    """
+    Scores every row at once. `metrics` maps energy/water/waste/greenery
+    to arrays (a DataFrame works too); missing values count as 0.
+    Returns a dict of arrays, or a DataFrame when given one.
+    """
+    profile = profile or get_profile()
+
+    scores = {}
+    weighted = 0
+    total_weight = 0
+
+    for metric in METRICS:
+        settings = profile[metric]
+        values = np.nan_to_num(np.asarray(metrics[metric], dtype=np.float64))
+        normalised = values / settings["scale"]
+
+        if settings["direction"] == "lower":
+            component = np.maximum(0, 100 - normalised)
+        else:
+            component = np.minimum(100, normalised)
+
+        scores[f"{metric}_score"] = component
+        weighted = weighted + component * settings["weight"]
+        total_weight += settings["weight"]
+
+    scores["total_score"] = np.round(weighted / total_weight, 2)
+
+    # Only callers that already imported pandas can pass a DataFrame, so
+    # rescore workers never pay for importing it
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(metrics, pd.DataFrame):
+        return pd.DataFrame(scores, index=metrics.index)
+    return scores
+
+
+# ================= MONTHLY METRICS =================
+# score_month()'s filter
+MONTH_WHERE = "WHERE year=? AND month=?"
+
+
+def monthly_metrics_sql(where=""):
+    """The statement monthly_metrics() runs for a WHERE clause."""
+    columns = ",\n".join(
+        f"MAX(CASE WHEN table_name='{m}_data' AND value_count > 0 "
+        f"THEN value_sum / value_count END) AS {m}"
+        for m in METRICS
+    )
+    return f"""
+        SELECT year, month,
+        {columns}
+        FROM monthly_aggregates
+        {where}
+        GROUP BY year, month
+        ORDER BY year, month
+    """
+
+
+def monthly_metrics(cursor, where="", params=()):
+    """
+    Average reading per metric for every month in monthly_aggregates,
+    optionally filtered by a WHERE clause on year/month. Returns a dict of
+    arrays including "month" and "year".
+    """
+    cursor.execute(monthly_metrics_sql(where), params)
+    rows = cursor.fetchall()
+
+    data = np.array([tuple(r) for r in rows], dtype=np.float64).reshape(-1, 2 + len(METRICS))
+    result = {
+        "year": data[:, 0].astype(np.int64),
+        "month": data[:, 1].astype(np.int64)
+    }
+    for i, metric in enumerate(METRICS, start=2):
+        result[metric] = data[:, i]
+    return result
+
+
+def write_scores(cursor, month, year, scores):
+    """Upserts one score row per (month, year). The caller commits."""
+    cursor.executemany("""
+        INSERT INTO sustainability_scores
+        (month, year, energy_score, water_score,
+         waste_score, greenery_score, total_score)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(year, month) DO UPDATE SET
+            energy_score = excluded.energy_score,
+            water_score = excluded.water_score,
+            waste_score = excluded.waste_score,
+            greenery_score = excluded.greenery_score,
+            total_score = excluded.total_score,
+            calculated_at = CURRENT_TIMESTAMP
+    """, zip(np.asarray(month).tolist(), np.asarray(year).tolist(),
+             *(np.asarray(scores[c]).tolist() for c in SCORE_COLUMNS)))
+
+
+def score_month(cursor, month, year, profile=None):
+    """Rescores a single month from its aggregates. The caller commits."""
+    metrics = monthly_metrics(cursor, MONTH_WHERE, (year, month))
+    if not len(metrics["month"]):
+        metrics = {"month": [month], "year": [year], **{m: [0.0] for m in METRICS}}
+
+    scores = score(metrics, profile)
+    write_scores(cursor, metrics["month"], metrics["year"], scores)
+    return float(scores["total_score"][0])
+
+
+def rescore(conn, profile=None):
+    """
+    Recomputes every month's score from monthly_aggregates with one
+    grouped read, one vectorized scoring call and one transaction.
+    Returns the number of months written.
+    """
+    cursor = conn.cursor()
+    metrics = monthly_metrics(cursor)
+
+    try:
+        write_scores(cursor, metrics["month"], metrics["year"], score(metrics, profile))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return len(metrics["month"])
@@ -0,0 +1,282 @@
+"""
+Columnar analytics snapshot.
+
+Exports the four reading tables and sustainability_scores to one file per
+table and year:
+
+    <SNAPSHOT_DIR>/<table>/year=<year>.parquet   zstd Parquet, for analysts
+    <SNAPSHOT_DIR>/<table>/year=<year>.arrow     Arrow IPC, for load_columns()
+
+Exports are incremental: manifest.json records a fingerprint of every
+(table, year) partition, and only partitions whose fingerprint changed are
+rewritten. The Arrow files are left uncompressed so load_columns() can
+memory-map them and hand out NumPy views without copying.
+
+Campuses other than the default one are exported to
+<SNAPSHOT_DIR>/<campus>/.
+
+Needs pyarrow (listed in requirements.txt), which is only imported here.
+
+    python snapshot.py             # incremental
+    python snapshot.py --full      # rewrite every partition
+    python snapshot.py --campus north
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from aggregates import DATA_TABLES
+from database import DEFAULT_CAMPUS, current_campus, get_connection
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "snapshots")
+
+SCORES_TABLE = "sustainability_scores"
+TABLES = DATA_TABLES + (SCORES_TABLE,)
+
+COLUMNS = {
+    **{t: ("id", "value", "month", "year", "entered_by") for t in DATA_TABLES},
+    SCORES_TABLE: ("month", "year", "energy_score", "water_score",
+                   "waste_score", "greenery_score", "total_score"),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(
+            "Columnar snapshots need pyarrow: pip install -r requirements.txt"
+        ) from None
+    return pyarrow
+
+
+def campus_dir(campus=None):
+    campus = campus or current_campus()
+    if campus == DEFAULT_CAMPUS:
+        return SNAPSHOT_DIR
+    return os.path.join(SNAPSHOT_DIR, campus)
+
+
+def _partition_path(directory, table, year, ext):
+    return os.path.join(directory, table, f"year={year}.{ext}")
+
+
+def _manifest_path(directory):
+    return os.path.join(directory, "manifest.json")
+
+
+def read_manifest(directory=SNAPSHOT_DIR):
+    try:
+        with open(_manifest_path(directory)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+# ================= FINGERPRINTS =================
+def fingerprints(cursor, table):
+    """
+    {year: fingerprint} for every year of `table`. Reading tables use
+    monthly_aggregates, the highest id and the year's data_changes counter
+    (bumped by triggers on every write), so no table scan is needed and
+    edits that keep the count and sum still change the fingerprint.
+    """
+    if table == SCORES_TABLE:
+        cursor.execute("""
+            SELECT year, COUNT(*), TOTAL(total_score), MAX(calculated_at)
+            FROM sustainability_scores
+            GROUP BY year
+        """)
+        return {str(r[0]): [r[1], round(r[2], 6), r[3]] for r in cursor.fetchall()}
+
+    cursor.execute("""
+        SELECT year, SUM(value_count), ROUND(TOTAL(value_sum), 6)
+        FROM monthly_aggregates
+        WHERE table_name=?
+        GROUP BY year
+    """, (table,))
+    prints = {}
+    for year, count, total in cursor.fetchall():
+        if not count:
+            continue
+        cursor.execute(f"""
+            SELECT (SELECT MAX(id) FROM {table} WHERE year=?),
+                   (SELECT changes FROM data_changes WHERE table_name=? AND year=?)
+        """, (year, table, year))
+        prints[str(year)] = [count, total, *cursor.fetchone()]
+    return prints
+
+
+# ================= EXPORT =================
+def _year_table(pa, cursor, table, year):
+    columns = COLUMNS[table]
+    cursor.execute(
+        f"SELECT {', '.join(columns)} FROM {table} WHERE year=? ORDER BY month",
+        (int(year),)
+    )
+    rows = cursor.fetchall()
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+
+    arrays = {}
+    for name, column in zip(columns, values):
+        if name in ("id", "month", "year", "entered_by"):
+            arrays[name] = pa.array(column, type=pa.int64())
+        else:
+            arrays[name] = pa.array(column, type=pa.float64())
+    return pa.table(arrays)
+
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def export_snapshot(conn, directory=SNAPSHOT_DIR, tables=TABLES, full=False):
+    """
+    Writes changed (table, year) partitions and returns
+    {"partitions": written, "rows": rows written, "skipped": unchanged}.
+    """
+    pa = _pyarrow()
+    started = time.perf_counter()
+
+    # Plain tuples: no sqlite3.Row per exported row
+    cursor = conn.cursor()
+    cursor.row_factory = None
+
+    manifest = read_manifest(directory)
+    written = rows = skipped = 0
+
+    for table in tables:
+        current = fingerprints(cursor, table)
+        previous = {} if full else manifest.get(table, {})
+
+        for year, fingerprint in current.items():
+            if previous.get(year) == fingerprint:
+                skipped += 1
+                continue
+
+            data = _year_table(pa, cursor, table, year)
+            _write_atomic(
+                _partition_path(directory, table, year, "parquet"),
+                lambda p: pa.parquet.write_table(data, p, compression="zstd")
+            )
+
+            def write_ipc(p):
+                with pa.OSFile(p, "wb") as sink:
+                    with pa.ipc.new_file(sink, data.schema) as writer:
+                        writer.write_table(data)
+
+            _write_atomic(_partition_path(directory, table, year, "arrow"), write_ipc)
+            written += 1
+            rows += data.num_rows
+
+        # Years that no longer have data
+        for year in set(previous) - set(current):
+            for ext in ("parquet", "arrow"):
+                try:
+                    os.remove(_partition_path(directory, table, year, ext))
+                except FileNotFoundError:
+                    pass
+
+        manifest[table] = current
+
+    def write_manifest(p):
+        with open(p, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    _write_atomic(_manifest_path(directory), write_manifest)
+
+    return {
+        "partitions": written,
+        "rows": rows,
+        "skipped": skipped,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+
+# ================= READ =================
+def load_columns(table, years=None, directory=SNAPSHOT_DIR):
+    """
+    Loads a table's snapshot as {column: ndarray}. Arrow files are
+    memory-mapped; with a single partition the arrays are zero-copy views
+    of the mapping, several partitions are concatenated once.
+    Returns None when there is no snapshot for the table.
+    """
+    import numpy as np
+
+    pa = _pyarrow()
+
+    available = read_manifest(directory).get(table)
+    if not available:
+        return None
+
+    wanted = sorted(available, key=int)
+    if years is not None:
+        wanted = [y for y in wanted if int(y) in {int(v) for v in years}]
+
+    parts = []
+    for year in wanted:
+        source = pa.memory_map(_partition_path(directory, table, year, "arrow"), "r")
+        parts.append(pa.ipc.open_file(source).read_all())
+
+    if not parts:
+        return {name: np.array([]) for name in COLUMNS[table]}
+
+    data = pa.concat_tables(parts)
+    columns = {}
+    for name in data.column_names:
+        chunks = [c.to_numpy(zero_copy_only=c.null_count == 0) for c in data[name].chunks]
+        columns[name] = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+    return columns
+
+
+def load_scores(conn, directory=None):
+    """
+    Score history from the current campus's snapshot, or None when pyarrow
+    is missing or the snapshot no longer matches the database.
+    """
+    try:
+        _pyarrow()
+    except RuntimeError:
+        return None
+
+    directory = directory or campus_dir()
+    cursor = conn.cursor()
+    if read_manifest(directory).get(SCORES_TABLE) != fingerprints(cursor, SCORES_TABLE):
+        return None
+    return load_columns(SCORES_TABLE, directory=directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--campus", default=None, help="campus to export (default: CAMPUS)")
+    parser.add_argument("--dir", help=f"output directory (default: {SNAPSHOT_DIR}[/<campus>])")
+    parser.add_argument("--table", action="append", choices=TABLES,
+                        help="export only this table (repeatable)")
+    parser.add_argument("--full", action="store_true", help="rewrite every partition")
+    args = parser.parse_args()
+
+    campus = args.campus or current_campus()
+    conn = get_connection(campus)
+    try:
+        stats = export_snapshot(conn, args.dir or campus_dir(campus),
+                                tuple(args.table or TABLES), args.full)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        conn.close()
+
+    print(f"✅ Wrote {stats['partitions']} partitions ({stats['rows']} rows), "
+          f"{stats['skipped']} unchanged, in {stats['seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
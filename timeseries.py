@@ -0,0 +1,305 @@
+"""
+Time-series storage for metered readings.
+
+Readings are (meter, timestamp, value) rows in per-year partitions,
+meter_readings_<year>, clustered by (meter_id, ts). Triggers on each
+partition keep two rollups current:
+
+    meter_daily    per meter and day   (sum, count)
+    meter_monthly  per meter and month (sum, count)
+
+and meter_monthly in turn feeds monthly_aggregates, so the dashboard and
+the scoring pipeline never read raw readings. Each meter-month counts as
+one reading of its metric: the month's total for energy, water and waste,
+the month's mean for greenery (a level, not a consumption).
+
+Dropping an old partition removes its raw readings but keeps the rollups,
+since DROP TABLE does not fire delete triggers.
+
+    python timeseries.py add-meter main-elec --building "Main Block" --metric energy
+"""
+import argparse
+import sys
+
+from database import get_connection
+
+# numpy, pandas and ingest are imported by the functions that handle
+# readings: aggregates and init_db only need the schema helpers.
+
+METRICS = ("energy", "water", "waste", "greenery")
+
+# Metrics whose monthly value is a mean rather than a total
+LEVEL_METRICS = ("greenery",)
+
+
+def contribution_sql(row):
+    """SQL for a meter-month's value as one monthly_aggregates reading."""
+    levels = ", ".join(f"'{m}_data'" for m in LEVEL_METRICS)
+    return f"""(CASE
+        WHEN {row}.value_count = 0 THEN 0
+        WHEN {row}.table_name IN ({levels}) THEN {row}.value_sum / {row}.value_count
+        ELSE {row}.value_sum
+    END)"""
+
+
+# ================= SCHEMA =================
+def create_schema(cursor):
+    """Dimension and rollup tables; called by init_db()."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS buildings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS meters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        building_id INTEGER NOT NULL,
+        metric TEXT NOT NULL CHECK(metric IN ('energy', 'water', 'waste', 'greenery')),
+        FOREIGN KEY (building_id) REFERENCES buildings(id)
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS meter_daily (
+        meter_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        value_sum REAL NOT NULL DEFAULT 0,
+        value_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (meter_id, day)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS meter_monthly (
+        meter_id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        table_name TEXT NOT NULL,
+        value_sum REAL NOT NULL DEFAULT 0,
+        value_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (meter_id, year, month)
+    ) WITHOUT ROWID
+    """)
+
+    # meter_monthly -> monthly_aggregates: swap the old contribution for
+    # the new one; a meter-month counts once while it has readings
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_meter_monthly_insert
+    AFTER INSERT ON meter_monthly
+    BEGIN
+        INSERT INTO monthly_aggregates (table_name, year, month, value_sum, value_count)
+        VALUES (NEW.table_name, NEW.year, NEW.month,
+                {contribution_sql("NEW")}, NEW.value_count > 0)
+        ON CONFLICT(table_name, year, month) DO UPDATE SET
+            value_sum = value_sum + excluded.value_sum,
+            value_count = value_count + excluded.value_count;
+    END
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_meter_monthly_update
+    AFTER UPDATE ON meter_monthly
+    BEGIN
+        UPDATE monthly_aggregates
+        SET value_sum = value_sum - {contribution_sql("OLD")} + {contribution_sql("NEW")},
+            value_count = value_count - (OLD.value_count > 0) + (NEW.value_count > 0)
+        WHERE table_name = NEW.table_name AND year = NEW.year AND month = NEW.month;
+    END
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_meters_building ON meters(building_id)")
+
+
+def _rollup_upsert(sign, row, partition_year):
+    day = f"date({row}.ts, 'unixepoch')"
+    month = f"CAST(strftime('%m', {row}.ts, 'unixepoch') AS INTEGER)"
+    return f"""
+        INSERT INTO meter_daily (meter_id, day, value_sum, value_count)
+        VALUES ({row}.meter_id, {day}, {sign}{row}.value, {sign}1)
+        ON CONFLICT(meter_id, day) DO UPDATE SET
+            value_sum = value_sum + excluded.value_sum,
+            value_count = value_count + excluded.value_count;
+
+        INSERT INTO meter_monthly (meter_id, year, month, table_name, value_sum, value_count)
+        VALUES ({row}.meter_id, {partition_year}, {month},
+                (SELECT metric || '_data' FROM meters WHERE id = {row}.meter_id),
+                {sign}{row}.value, {sign}1)
+        ON CONFLICT(meter_id, year, month) DO UPDATE SET
+            value_sum = value_sum + excluded.value_sum,
+            value_count = value_count + excluded.value_count;
+    """
+
+
+def partition_name(year):
+    return f"meter_readings_{int(year)}"
+
+
+def ensure_partition(cursor, year):
+    """Creates the readings partition for `year` and its rollup triggers."""
+    table = partition_name(year)
+
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        meter_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (meter_id, ts)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_insert
+    AFTER INSERT ON {table}
+    BEGIN
+        {_rollup_upsert("", "NEW", year)}
+    END
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_delete
+    AFTER DELETE ON {table}
+    BEGIN
+        {_rollup_upsert("-", "OLD", year)}
+    END
+    """)
+
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_update
+    AFTER UPDATE OF value ON {table}
+    BEGIN
+        {_rollup_upsert("-", "OLD", year)}
+        {_rollup_upsert("", "NEW", year)}
+    END
+    """)
+
+    return table
+
+
+# ================= READINGS =================
+def meter_ids(cursor, names):
+    """Maps meter names to ids. Unknown names map to None."""
+    names = list(set(names))
+    ids = {}
+    for start in range(0, len(names), 500):
+        batch = names[start:start + 500]
+        cursor.execute(
+            f"SELECT id, name FROM meters WHERE name IN ({','.join('?' * len(batch))})",
+            batch
+        )
+        ids.update({r["name"]: r["id"] for r in cursor.fetchall()})
+    return ids
+
+
+def prepare_meter_readings(cursor, df, row_offset=0):
+    """
+    Validates (meter, timestamp, value) readings as whole arrays. meter is
+    a registered meter name; timestamp is unix seconds or an ISO 8601
+    string (UTC unless it carries an offset). Returns a dict of arrays.
+    """
+    import numpy as np
+    import pandas as pd
+
+    from ingest import IngestError, _bad_rows
+
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+
+    missing = [c for c in ("meter", "timestamp", "value") if c not in df.columns]
+    if missing:
+        raise IngestError(f"Missing fields: {', '.join(missing)}")
+
+    names = df["meter"].astype(str).str.strip()
+    meter = names.map(meter_ids(cursor, names))
+    unknown = meter.isna().to_numpy()
+    if unknown.any():
+        raise IngestError(f"Unknown meter in rows: {_bad_rows(unknown, row_offset)}")
+
+    epoch = pd.to_numeric(df["timestamp"], errors="coerce")
+    parsed = pd.to_datetime(
+        df["timestamp"].where(epoch.isna()), utc=True, errors="coerce", format="ISO8601"
+    )
+    seconds = (parsed - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+    ts = epoch.fillna(seconds)
+
+    value = pd.to_numeric(df["value"], errors="coerce")
+    bad = (ts.isna() | value.isna() | ~np.isfinite(value)).to_numpy()
+    if bad.any():
+        raise IngestError(f"Invalid timestamp or value in rows: {_bad_rows(bad, row_offset)}")
+
+    return {
+        "meter_id": meter.to_numpy(dtype=np.int64),
+        "ts": ts.to_numpy(dtype=np.int64),
+        "value": value.to_numpy(dtype=np.float64)
+    }
+
+
+def write_meter_readings(cursor, meter_id, ts, value):
+    """
+    Upserts readings (arrays of meter ids, unix timestamps and values) into
+    their yearly partitions with one executemany per partition. A repeated
+    (meter, timestamp) replaces the earlier value. The caller owns the
+    transaction. Returns the set of (month, year) pairs touched.
+    """
+    import numpy as np
+
+    meter_id = np.asarray(meter_id, dtype=np.int64)
+    ts = np.asarray(ts, dtype=np.int64)
+    value = np.asarray(value, dtype=np.float64)
+
+    dates = ts.astype("datetime64[s]")
+    years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    months = dates.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    for year in np.unique(years):
+        mask = years == year
+        table = ensure_partition(cursor, int(year))
+        cursor.executemany(f"""
+            INSERT INTO {table} (meter_id, ts, value) VALUES (?, ?, ?)
+            ON CONFLICT(meter_id, ts) DO UPDATE SET value = excluded.value
+        """, zip(meter_id[mask].tolist(), ts[mask].tolist(), value[mask].tolist()))
+
+    return set(zip(months.tolist(), years.tolist()))
+
+
+# ================= CLI =================
+def add_meter(conn, name, building, metric):
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+
+    cursor = conn.cursor()
+    cursor.execute("INSERT OR IGNORE INTO buildings (name) VALUES (?)", (building,))
+    cursor.execute("SELECT id FROM buildings WHERE name=?", (building,))
+    building_id = cursor.fetchone()["id"]
+
+    cursor.execute(
+        "INSERT INTO meters (name, building_id, metric) VALUES (?, ?, ?)",
+        (name, building_id, metric)
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage metered time-series data")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    meter = sub.add_parser("add-meter")
+    meter.add_argument("name")
+    meter.add_argument("--building", required=True)
+    meter.add_argument("--metric", required=True, choices=METRICS)
+
+    args = parser.parse_args()
+    conn = get_connection()
+    try:
+        meter_id = add_meter(conn, args.name, args.building, args.metric)
+    finally:
+        conn.close()
+
+    print(f"✅ Meter {args.name} added (id {meter_id})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())